@@ -11,52 +11,72 @@ Endpoints principais:
 - /v1/meta
 - /v1/risk/by_bairro            (JSON tabular com filtros)
 - /v1/risk/by_bairro/csv        (CSV)
+- /v1/risk/export               (CSV/NDJSON em streaming de um intervalo de datas, gzip opcional)
 - /v1/risk/by_bairro/top        (Top-N por data)
+- /v1/risk/series               (Série colunar do horizonte inteiro, todos/alguns bairros)
 - /v1/geo/canoas/bairros_risk   (GeoJSON mapa por data, com include=basic|infra|hazard|all)
+- /v1/tiles/{date}/{z}/{x}/{y}.mvt (vector tiles da camada de risco)
 - /v1/bairros/detail            (Detalhe de um bairro em uma data; U dinâmico opcional)
 - /v1/filters                   (Esquema de filtros)
 - /v1/insights/by_bairro        (Narrativa + ações por bairro/data via OpenAI)
 - /v1/insights/city_top         (Síntese municipal top-N por data via OpenAI)
+- /v1/insights/*/stream         (As mesmas respostas em streaming SSE)
 
 Requisitos de arquivo:
 - data/hazard/hazard_forecast.csv       (date, H_score, [p6_pct,a72_pct,sm_norm,et_deficit,p1_pct,pp_unit,rd_norm])
+- data/hazard/hazard_by_bairro.csv      (opcional: date, bairro, H_score, [fatores]; H por bairro)
 - data/u/canoas_bairros_u.csv           (por bairro: U_t/U_static + sub-índices + métricas)
 - data/u/canoas_bairros_u.geojson       (geometria + as mesmas propriedades)
 - data/pop/canoas_bairros_pop.csv       (opcional: bairro,population)
+Cada tabela pode vir em Parquet (x.parquet) e a geometria em GeoParquet (x.geo.parquet);
+o arquivo mais novo entre o colunar e o texto é o usado.
 """
 
-from fastapi import FastAPI, HTTPException, Query, Body
+from fastapi import FastAPI, HTTPException, Query, Body, Header, Path as PathParam
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import PlainTextResponse, JSONResponse
+from fastapi.responses import PlainTextResponse, JSONResponse, Response, StreamingResponse
 from typing import Optional, Dict, Any
 from pathlib import Path
+from contextlib import asynccontextmanager
 import pandas as pd
 import geopandas as gpd
 import numpy as np
-import yaml, json, os, textwrap
-from datetime import date, timedelta, timezone
+import yaml, json, os, textwrap, time, asyncio
+
+from services.snapshot import DataSnapshot, SnapshotStore
+from services.risk_engine import (
+    build_risk_cube, bucket_risk, compile_filters, LEVELS, U_SUBINDICES, INFRA_METRICS,
+)
+from services.geometry_store import geometry_store_for
+from services import storage
+from services.geo_render import BytesLRU, build_geo_features, etag_matches, normalize_include, simplify_levels
+from services.shared_snapshot import shared_snapshots
+from services.geo_formats import MEDIA_TYPES, PYARROW_OK, PYOGRIO_OK, arrow_ipc_bytes
+from services.tiles import MEDIA_TYPE as MVT_MEDIA_TYPE
+from services.export import iter_csv, iter_ndjson, gzip_stream
+from services.insight_cache import InsightCache, insight_key
+from services.insight_prewarm import InsightPrewarmer, INSIGHT_PREWARM
+from services.insight_stream import SSE_HEADERS, sse, stream_insight
 
 # OpenAI (insights)
 try:
-    from openai import OpenAI
+    from openai import OpenAI, AsyncOpenAI
     OPENAI_SDK_OK = True
 except Exception:
     OPENAI_SDK_OK = False
 
-# Open-Meteo (apenas p/ recálculo dinâmico de U no detalhe, se desejar)
-try:
-    import openmeteo_requests
-    import requests_cache
-    from retry_requests import retry
-    OM_AVAILABLE = True
-except Exception:
-    OM_AVAILABLE = False
+# Open-Meteo assíncrono (apenas p/ recálculo dinâmico de U no detalhe, se desejar)
+from services.meteo_async import AsyncOpenMeteo, HTTPX_OK as OM_AVAILABLE
+from services.dryness import DrynessStore
+from services.scheduler import HazardScheduler
 
 # ----------------------------------- Paths -----------------------------------
+# nomes históricos; storage lê o irmão colunar (x.parquet / x.geo.parquet) quando é o mais novo
 
 ROOT = Path(".").resolve()
 DATA = ROOT / "services" / "data"
 HAZARD_CSV = DATA / "hazard" / "hazard_forecast.csv"
+HAZARD_BAIRRO_CSV = DATA / "hazard" / "hazard_by_bairro.csv"   # opcional: H por bairro
 U_CSV = DATA / "u" / "canoas_bairros_u.csv"
 U_GEOJSON = DATA / "u" / "canoas_bairros_u.geojson"
 POP_CSV = DATA / "pop" / "canoas_bairros_pop.csv"   # opcional
@@ -64,7 +84,31 @@ WEIGHTS_YAML = ROOT / "configs" / "weights.yaml"
 
 # ----------------------------------- App -------------------------------------
 
-app = FastAPI(title="Canoas - Risco por Bairros API", version="1.2.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # carrega o snapshot no startup (se os arquivos ainda não existem, os endpoints respondem 404 como antes)
+    try:
+        get_snapshot()
+    except HTTPException as e:
+        print(f"⚠️ Snapshot não carregado no startup: {e.detail}")
+    # grade de dryness em segundo plano, iniciada no 1º dynamic=1 (nenhuma chamada de rede nas requisições)
+    refresher = asyncio.create_task(DRYNESS.run(_bairro_centroids)) if OM_AVAILABLE and DRYNESS.enabled else None
+    # pipeline de hazard agendado (HAZARD_REFRESH_SECONDS > 0); publica trocando o snapshot
+    hazard_task = asyncio.create_task(HAZARD.run()) if HAZARD.interval > 0 else None
+    # insights dos bairros amarelo/vermelho gerados a cada novo snapshot (INSIGHT_PREWARM=1)
+    prewarm_task = asyncio.create_task(PREWARM.run()) if _prewarm_enabled() else None
+    yield
+    if prewarm_task is not None:
+        prewarm_task.cancel()
+    if hazard_task is not None:
+        hazard_task.cancel()
+    if refresher is not None:
+        refresher.cancel()
+        await om_client.aclose()
+    if _async_openai is not None:
+        await _async_openai.close()
+
+app = FastAPI(title="Canoas - Risco por Bairros API", version="1.2.0", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware, allow_origins=["*"], allow_methods=["*"], allow_headers=["*"]
 )
@@ -81,19 +125,29 @@ def load_weights() -> Dict[str, Any]:
     }
 
 def try_load_hazard() -> pd.DataFrame:
-    if not HAZARD_CSV.exists():
-        raise HTTPException(404, detail="hazard_forecast.csv não encontrado em data/hazard/")
-    df = pd.read_csv(HAZARD_CSV)
+    if not storage.exists(HAZARD_CSV):
+        raise HTTPException(404, detail="hazard_forecast (.parquet/.csv) não encontrado em data/hazard/")
+    df = storage.read_table(HAZARD_CSV)
     if "date" not in df.columns or "H_score" not in df.columns:
         raise HTTPException(500, detail="hazard_forecast.csv deve conter colunas 'date' e 'H_score'.")
     df["date"] = pd.to_datetime(df["date"])
     return df
 
+def try_load_hazard_bairro() -> Optional[pd.DataFrame]:
+    if not storage.exists(HAZARD_BAIRRO_CSV):
+        return None
+    df = storage.read_table(HAZARD_BAIRRO_CSV)
+    if not {"date", "bairro", "H_score"} <= set(df.columns):
+        print("⚠️ hazard_by_bairro.csv sem colunas date/bairro/H_score; usando H da cidade")
+        return None
+    df["bairro"] = df["bairro"].astype(str)
+    return df
+
 def try_load_u() -> (pd.DataFrame, gpd.GeoDataFrame):
-    if not U_CSV.exists() or not U_GEOJSON.exists():
-        raise HTTPException(404, detail="Arquivos de U não encontrados (CSV/GeoJSON).")
-    dfU = pd.read_csv(U_CSV)
-    gdfU = gpd.read_file(U_GEOJSON)
+    if not storage.exists(U_CSV) or not storage.exists(U_GEOJSON):
+        raise HTTPException(404, detail="Arquivos de U não encontrados (Parquet/GeoParquet ou CSV/GeoJSON).")
+    dfU = storage.read_table(U_CSV)
+    gdfU = storage.read_geo(U_GEOJSON)
     if gdfU.crs is None:
         gdfU.set_crs(epsg=4326, inplace=True)
     else:
@@ -116,81 +170,99 @@ def try_load_u() -> (pd.DataFrame, gpd.GeoDataFrame):
     gdfU["bairro"] = gdfU["bairro"].astype(str)
     return dfU, gdfU
 
-def bucket_risk(x: float, thresholds: Dict[str,float]) -> str:
-    if pd.isna(x): return "no_data"
-    g = thresholds["green_max"]; y = thresholds["yellow_max"]
-    if x < g: return "green"
-    if x < y: return "yellow"
-    return "red"
-
-def apply_filters(df: pd.DataFrame, params: Dict[str, Any]) -> pd.DataFrame:
-    out = df.copy()
-    # Risk level
-    levels = params.get("risk_level")
-    if levels:
-        allowed = set([s.strip().lower() for s in levels.split(",")])
-        out = out[out["Risk_level"].str.lower().isin(allowed)]
-    # Score range
-    min_r = params.get("min_risk"); max_r = params.get("max_risk")
-    if min_r is not None: out = out[out["Risk_score"] >= float(min_r)]
-    if max_r is not None: out = out[out["Risk_score"] <= float(max_r)]
-    # Hazard factors (se existirem no hazard CSV)
-    for k in ["p6_pct","a72_pct","sm_norm","et_deficit","p1_pct","pp_unit","rd_norm"]:
-        lo = params.get(f"min_{k}"); hi = params.get(f"max_{k}")
-        if lo is not None and k in out.columns: out = out[out[k] >= float(lo)]
-        if hi is not None and k in out.columns: out = out[out[k] <= float(hi)]
-    # Infra subíndices
-    for k in ["u_cobertura","u_micro","u_macro","u_permeabilidade"]:
-        lo = params.get(f"min_{k}"); hi = params.get(f"max_{k}")
-        if lo is not None and k in out.columns: out = out[out[k] >= float(lo)]
-        if hi is not None and k in out.columns: out = out[out[k] <= float(hi)]
-    return out.reset_index(drop=True)
-
-# --------- Open‑Meteo (opcional): recálculo de dryness -> U(t) no detalhe ---------
-
-TZ = "America/Sao_Paulo"
-FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-if OM_AVAILABLE:
-    import requests_cache
-    cache_session = requests_cache.CachedSession('.cache', expire_after=1800)
-    from retry_requests import retry
-    retry_session = retry(cache_session, retries=3, backoff_factor=0.3)
-    om_client = openmeteo_requests.Client(session=retry_session)
-
-def compute_dryness_for_date(lat: float, lon: float, target_date: pd.Timestamp) -> Dict[str, float]:
-    if not OM_AVAILABLE:
-        return {"sm_norm": None, "et_scaled": None, "dryness": None}
-    today = pd.Timestamp(date.today(), tz=timezone.utc).tz_convert(TZ).date()
-    td = pd.to_datetime(target_date).date()
-    if td < (today - timedelta(days=2)) or td > (today + timedelta(days=16)):
-        return {"sm_norm": None, "et_scaled": None, "dryness": None}
-    hourly_vars = ["evapotranspiration","soil_moisture_0_to_1cm"]
-    params = {"latitude": lat, "longitude": lon, "timezone": TZ, "past_days": 2, "forecast_days": 16, "hourly": hourly_vars}
-    resp = om_client.weather_api(FORECAST_URL, params=params)[0]
-    h = resp.Hourly()
-    times = pd.date_range(start=pd.to_datetime(h.Time(), unit="s", utc=True), end=pd.to_datetime(h.TimeEnd(), unit="s", utc=True),
-                          freq=pd.Timedelta(seconds=h.Interval()), inclusive="left")
-    df = pd.DataFrame({"time": times})
-    for i in range(h.VariablesLength()):
-        name = hourly_vars[i] if i < len(hourly_vars) else f"var_{i}"
-        try: df[name] = h.Variables(i).ValuesAsNumpy()
-        except Exception: df[name] = np.nan
-    df["time_local"] = df["time"].dt.tz_convert(TZ); df["date"] = df["time_local"].dt.date
-    et24 = float(df[df["date"] == td]["evapotranspiration"].sum()) if "evapotranspiration" in df else np.nan
-    sm6  = float(df[df["date"] == td].tail(6)["soil_moisture_0_to_1cm"].mean()) if "soil_moisture_0_to_1cm" in df else np.nan
-    sm_lo, sm_hi = 0.10, 0.45; et_lo, et_hi = 1.0, 6.0
-    def clamp01(x): return float(max(0.0, min(1.0, x)))
-    def scale(x, lo, hi): return clamp01((x - lo) / (hi - lo) if hi != lo else 0.0)
-    sm_norm = scale(sm6, sm_lo, sm_hi) if sm6 == sm6 else None
-    et_scaled = scale(et24, et_lo, et_hi) if et24 == et24 else None
-    if sm_norm is None or et_scaled is None: return {"sm_norm": None, "et_scaled": None, "dryness": None}
-    dryness = 0.5*(1.0 - sm_norm) + 0.5*et_scaled
-    return {"sm_norm": sm_norm, "et_scaled": et_scaled, "dryness": clamp01(dryness)}
+def _parse_snapshot(version: int) -> Dict[str, Any]:
+    """Lê e processa os datasets (o trabalho que o snapshot compartilhado evita repetir por worker)."""
+    w = load_weights()
+    dfH = try_load_hazard()
+    dfU, gdfU = try_load_u()
+    return dict(
+        hazard=dfH, u=dfU, geo=gdfU, shapes=simplify_levels(gdfU.geometry.values.to_numpy()),
+        cube=build_risk_cube(dfH, dfU, w["hazard_levels"], try_load_hazard_bairro()),
+        weights=w, thresholds=w["hazard_levels"], population=_load_population(),
+    )
+
+def _build_snapshot(version: int, signature) -> DataSnapshot:
+    if SHARED is not None:
+        parts = SHARED.load_or_publish(signature, _parse_snapshot)   # mapeia a versão publicada
+        version = parts["version"]
+    else:
+        parts = _parse_snapshot(version)
+    gdfU, cube = parts["geo"], parts["cube"]
+    return DataSnapshot(
+        version=version, signature=signature, loaded_at=time.time(),
+        hazard_table=parts["hazard"], u_table=parts["u"], geo=gdfU,
+        weights=parts["weights"], thresholds=parts["thresholds"],
+        population=parts["population"],
+        cube=cube,
+        geo_features=build_geo_features(gdfU, cube, parts["shapes"]),
+        geom=geometry_store_for(storage.resolve(U_GEOJSON), gdfU["bairro"].tolist(), gdfU.geometry.values),
+    )
+
+# Com SHARED_SNAPSHOT_DIR, os workers mapeiam o snapshot publicado por um deles (Arrow IPC)
+SHARED = shared_snapshots()
+
+# Snapshot em memória: recarregado só quando o mtime de algum arquivo muda.
+# hazard_by_bairro não entra na assinatura: o pipeline o grava antes do hazard_forecast,
+# e a troca só acontece quando este muda (nunca H por bairro novo com H da cidade antigo).
+SNAPSHOT = SnapshotStore(
+    [*storage.sources(HAZARD_CSV), *storage.sources(U_CSV),
+     *storage.sources(U_GEOJSON), WEIGHTS_YAML, *storage.sources(POP_CSV)], _build_snapshot,
+    check_interval=float(os.getenv("SNAPSHOT_CHECK_SECONDS", "2")),
+)
+
+def get_snapshot() -> DataSnapshot:
+    return SNAPSHOT.get()
+
+def _publish_hazard():
+    SNAPSHOT.refresh(force=True)
+    PREWARM.notify()   # pré-geração de insights do novo snapshot, se ativa
+
+HAZARD = HazardScheduler(out_dir=HAZARD_CSV.parent, on_publish=_publish_hazard)
+
+# snapshots por município (hoje só Canoas); a exportação aceita vários
+CITY_SNAPSHOTS = {"canoas": SNAPSHOT}
+
+def _require_format(fmt: str) -> None:
+    if fmt == "arrow" and not PYARROW_OK:
+        raise HTTPException(500, detail="Pacote 'pyarrow' não instalado. pip install pyarrow")
+    if fmt == "fgb" and not PYOGRIO_OK:
+        raise HTTPException(500, detail="Pacote 'pyogrio' não instalado. pip install pyogrio")
+
+# --------- Open‑Meteo (opcional): grade de dryness -> U(t) no detalhe ---------
+
+# cliente compartilhado (pool httpx); a grade inteira vem de uma requisição multi-localização
+om_client = AsyncOpenMeteo(timeout=float(os.getenv("OPEN_METEO_TIMEOUT", "10")))
+DRYNESS = DrynessStore(om_client, interval=float(os.getenv("DRYNESS_REFRESH_SECONDS", "3600")))   # 0 = desativado
+
+def _bairro_centroids():
+    geom = get_snapshot().geom
+    return geom.lat, geom.lon
+
+DRYNESS_REASONS = {
+    "disabled": "grade de dryness desativada (DRYNESS_REFRESH_SECONDS=0 ou httpx ausente)",
+    "loading": "grade de dryness ainda carregando; tente novamente em instantes",
+    "outside": "data ou bairro fora da grade de dryness",
+}
+
+def _dynamic_u(snap: DataSnapshot, grid) -> np.ndarray:
+    """U(t) (data x bairro) nos eixos do cubo, vetorizado; uma vez por (grade, snapshot)."""
+    cube, geom = snap.cube, snap.geom
+    idx = np.array([-1 if (i := geom.index(b)) is None else i for b in cube.bairros], dtype=np.int64)
+    lat = np.where(idx >= 0, geom.lat[np.maximum(idx, 0)], np.nan)
+    lon = np.where(idx >= 0, geom.lon[np.maximum(idx, 0)], np.nan)
+    return DRYNESS.u_matrix(grid, snap.version, cube.dates, lat, lon, cube.U_static)
 
 # ------------------------------ LLM / RAG helpers ------------------------------
 
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+# cache de insights (SQLite) por hash da requisição; TTL 0 desativa
+INSIGHTS = InsightCache(
+    Path(os.getenv("INSIGHT_CACHE_PATH", str(DATA / "cache" / "llm_insights.sqlite"))),
+    ttl=float(os.getenv("INSIGHT_CACHE_TTL", "21600")),
+    max_entries=int(os.getenv("INSIGHT_CACHE_MAX", "2000")),
+)
+
 def _get_openai_client() -> OpenAI:
     if not OPENAI_SDK_OK:
         raise HTTPException(500, detail="Pacote 'openai' não instalado. pip install openai")
@@ -199,10 +271,24 @@ def _get_openai_client() -> OpenAI:
         raise HTTPException(500, detail="OPENAI_API_KEY ausente no ambiente.")
     return OpenAI(api_key=api_key)
 
+# cliente assíncrono único (pool de conexões) para os endpoints de streaming; fechado no shutdown
+_async_openai: Optional["AsyncOpenAI"] = None
+
+def _get_async_openai_client() -> "AsyncOpenAI":
+    global _async_openai
+    if not OPENAI_SDK_OK:
+        raise HTTPException(500, detail="Pacote 'openai' não instalado. pip install openai")
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise HTTPException(500, detail="OPENAI_API_KEY ausente no ambiente.")
+    if _async_openai is None:
+        _async_openai = AsyncOpenAI(api_key=api_key)
+    return _async_openai
+
 def _load_population() -> dict:
-    if not POP_CSV.exists(): return {}
+    if not storage.exists(POP_CSV): return {}
     try:
-        dfp = pd.read_csv(POP_CSV)
+        dfp = storage.read_table(POP_CSV)
         if "bairro" not in dfp.columns:
             for c in dfp.columns:
                 if c.lower().startswith("bair"):
@@ -287,7 +373,26 @@ def _insight_schema(max_actions: int, lang: str) -> dict:
         "required":["language","summary","alerts","actions","confidence"]
     }
 
-def _call_llm_insight(client: OpenAI, model: str, rag_text: str, context: dict, schema: dict, lang: str) -> dict:
+def _llm_json(model: str, messages: list) -> Optional[dict]:
+    """Chamada JSON ao modelo; None se a resposta não for JSON válido (não vai para o cache)."""
+    client = _get_openai_client()
+    resp = client.chat.completions.create(
+        model=model,
+        messages=messages,
+        temperature=0.2,
+        response_format={"type":"json_object"}
+    )
+    try:
+        return json.loads(resp.choices[0].message.content)
+    except Exception:
+        return None
+
+def _cached_llm_json(model: str, messages: list) -> Optional[dict]:
+    # mesma requisição (modelo + mensagens) => mesma chave; concorrentes esperam a mesma chamada
+    key = insight_key(model, messages, temperature=0.2)
+    return INSIGHTS.get_or_compute(key, lambda: _llm_json(model, messages))
+
+def _insight_messages(rag_text: str, context: dict, schema: dict, lang: str) -> list:
     sys = f"Você é analista de defesa civil. Responda em {lang}. Devolva SOMENTE JSON válido que siga o schema."
     usr = {
         "role":"user",
@@ -309,16 +414,91 @@ def _call_llm_insight(client: OpenAI, model: str, rag_text: str, context: dict,
         - Se houver população, cite exposição de modo sucinto e não alarmista.
         """)
     }
-    resp = client.chat.completions.create(
-        model=model,
-        messages=[{"role":"system","content":sys}, usr],
-        temperature=0.2,
-        response_format={"type":"json_object"}
-    )
-    try:
-        return json.loads(resp.choices[0].message.content)
-    except Exception:
-        return {"language": lang, "summary":"", "alerts":[], "actions":[], "confidence":0.5}
+    return [{"role":"system","content":sys}, usr]
+
+def _fallback_insight(lang: str) -> dict:
+    return {"language": lang, "summary":"", "alerts":[], "actions":[], "confidence":0.5}
+
+def _call_llm_insight(model: str, rag_text: str, context: dict, schema: dict, lang: str) -> dict:
+    out = _cached_llm_json(model, _insight_messages(rag_text, context, schema, lang))
+    return _fallback_insight(lang) if out is None else out
+
+def _bairro_insight_head(snap: DataSnapshot, bairro: str, date: Optional[str]) -> tuple:
+    """(cabeçalho da resposta, contexto do LLM); contexto None => cabeçalho é a resposta no_data."""
+    cube = snap.cube
+    d = cube.date_index(date); d_iso = cube.dates[d]
+
+    b = cube.bairro_index(bairro)
+    if b is None: raise HTTPException(404, detail=f"Bairro '{bairro}' não encontrado.")
+    if not cube.valid[b]:
+        return {"bairro": bairro, "date": d_iso, "status": "no_data"}, None
+
+    Risk = float(cube.score[d, b]); level = LEVELS[cube.level[d, b]]
+
+    pop_est = snap.population.get(str(bairro))
+    exposure = round(pop_est * Risk) if pop_est is not None else None
+
+    head = {
+        "city": "canoas",
+        "bairro": bairro,
+        "date": d_iso,
+        "risk": {"score": round(Risk,3), "level": level},
+        "population": {"estimate": pop_est, "exposure_estimate": exposure},
+    }
+    return head, _bairro_insight_context(snap, d, b)
+
+def _bairro_insight_context(snap: DataSnapshot, d: int, b: int) -> dict:
+    cube = snap.cube
+    return _build_bairro_context(snap.u.iloc[b], float(cube.H[d, b]), LEVELS[cube.level[d, b]], cube.dates[d],
+                                 snap.population.get(cube.bairros[b]))
+
+def _city_top_messages(rows: list, lang: str) -> list:
+    rag = textwrap.dedent("""
+    Objetivo: síntese para decisão operacional municipal.
+    - Liste os bairros em ordem de risco com pontuação.
+    - Recomende alocação de equipes e ações emergenciais rápidas.
+    - Texto curto (<= 1200 caracteres).
+    """)
+    ctx = {"date": rows[0]["date"], "items": rows}
+    schema = {"type":"object","properties":{
+        "language":{"type":"string"},
+        "summary":{"type":"string"},
+        "prioritized_allocation":{"type":"array","items":{"type":"string"}}
+    }, "required":["language","summary","prioritized_allocation"]}
+    sys = f"Você é analista de operações municipais. Responda em {lang}. Devolva SOMENTE JSON."
+    usr = {"role":"user","content": f"RAG:\n{rag}\n\nDATA:\n{json.dumps(ctx, ensure_ascii=False)}\n\nSCHEMA:\n{json.dumps(schema)}"}
+    return [{"role":"system","content":sys}, usr]
+
+def _city_top_insight(rows: list, lang: str) -> dict:
+    out = _cached_llm_json(OPENAI_MODEL, _city_top_messages(rows, lang))
+    if out is None: out = {"language": lang, "summary":"", "prioritized_allocation":[]}
+    return out
+
+# ------------- Pré-geração de insights (amarelo/vermelho + city_top) -------------
+
+PREWARM_LANG = os.getenv("INSIGHT_PREWARM_LANG", "pt-BR")
+PREWARM_LEVELS = (LEVELS.index("yellow"), LEVELS.index("red"))
+
+def _prewarm_jobs(snap: DataSnapshot) -> list:
+    """Mesmas requisições dos endpoints com parâmetros padrão (max_actions=5, n=5)."""
+    cube = snap.cube
+    schema = _insight_schema(max_actions=5, lang=PREWARM_LANG)
+    jobs = []
+    for d, d_iso in enumerate(cube.dates):
+        for b in np.flatnonzero(np.isin(cube.level[d], PREWARM_LEVELS) & cube.valid):
+            ctx = _bairro_insight_context(snap, d, int(b))
+            jobs.append((f"{cube.bairros[b]} {d_iso}",
+                         lambda ctx=ctx: _cached_llm_json(OPENAI_MODEL, _insight_messages(_playbook_text(), ctx, schema, PREWARM_LANG))))
+        rows = cube.records(d, cube.top(d, 5))
+        if rows:
+            jobs.append((f"city_top {d_iso}",
+                         lambda rows=rows: _cached_llm_json(OPENAI_MODEL, _city_top_messages(rows, PREWARM_LANG))))
+    return jobs
+
+PREWARM = InsightPrewarmer(get_snapshot, _prewarm_jobs)
+
+def _prewarm_enabled() -> bool:
+    return INSIGHT_PREWARM and OPENAI_SDK_OK and bool(os.getenv("OPENAI_API_KEY")) and INSIGHTS.enabled
 
 # ----------------------------------- Endpoints --------------------------------
 
@@ -328,8 +508,8 @@ def health():
 
 @app.get("/v1/meta")
 def meta():
-    w = load_weights()
-    dfH = try_load_hazard()
+    snap = get_snapshot()
+    w = snap.weights; dfH = snap.hazard
     return {
         "city": "canoas",
         "timezone": "America/Sao_Paulo",
@@ -337,6 +517,8 @@ def meta():
         "hazard_date_max": dfH["date"].max().date().isoformat(),
         "thresholds": w["hazard_levels"],
         "weights": {"hazard": w["hazard_daily_weights"], "u": w["u_weights"]},
+        "data_version": snap.version,
+        "hazard_resolution": "bairro" if snap.cube.local_hazard else "city",
         "notes": "U==0 → no_data; ranking ignora no_data."
     }
 
@@ -358,110 +540,152 @@ def risk_by_bairro(
     min_p1_pct: Optional[float] = None, max_p1_pct: Optional[float] = None,
     min_pp_unit: Optional[float] = None, max_pp_unit: Optional[float] = None,
     min_rd_norm: Optional[float] = None, max_rd_norm: Optional[float] = None,
+    fmt: str = Query("json", alias="format", pattern="^(json|csv|arrow)$", description="json|csv|arrow"),
 ):
-    dfH = try_load_hazard()
-    dfU, _ = try_load_u()
-    thr = load_weights()["hazard_levels"]
-
-    # Seleção de data
-    df_sel = dfH if date_str is None else dfH[dfH["date"].dt.date == pd.to_datetime(date_str).date()]
-    if df_sel.empty: df_sel = dfH[dfH["date"] == dfH["date"].max()]
-    H = float(df_sel["H_score"].iloc[0]); d_sel = df_sel["date"].iloc[0]
-
-    # Base por bairro
-    df = dfU.copy()
-    df["U"] = df.get("U_t", df.get("U_static", 0)).fillna(0)
-    df["U_valid"] = df["U"] > 0
-    df.loc[~df["U_valid"], ["Risk_score","Risk_level"]] = [np.nan,"no_data"]
-    dfv = df[df["U_valid"]].copy()
-    dfv["Fragilidade"] = 1 - dfv["U"]
-    dfv["Risk_score"] = (H * dfv["Fragilidade"]).clip(0,1)
-    dfv["Risk_level"] = dfv["Risk_score"].apply(lambda x: bucket_risk(x, thr))
-    df.update(dfv)
-
-    # Replica fatores de hazard (se existirem)
-    rowH = dfH[dfH["date"]==d_sel].head(1)
-    for k in ["p6_pct","a72_pct","sm_norm","et_deficit","p1_pct","pp_unit","rd_norm"]:
-        if k in rowH.columns:
-            df[k] = float(rowH.iloc[0][k]) if pd.notna(rowH.iloc[0][k]) else np.nan
-
-    # Filtros
-    params = {k: v for k, v in locals().items() if k.startswith("min_") or k.startswith("max_") or k=="risk_level"}
-    df = apply_filters(df, params)
+    cube = get_snapshot().cube
+    d = cube.date_index(date_str)
 
-    df["date"] = d_sel.date().isoformat(); df["H_score"] = H
-    cols = ["bairro","date","H_score","U","U_valid","Risk_score","Risk_level",
-            "u_cobertura","u_micro","u_macro","u_permeabilidade",
-            "p6_pct","a72_pct","sm_norm","et_deficit","p1_pct","pp_unit","rd_norm"]
-    cols = [c for c in cols if c in df.columns]
-    df = df.replace({np.nan: None, np.inf: None, -np.inf: None})  # <-- adiciona aqui
-    return df[cols].to_dict(orient="records")
+    # Filtros (máscara única sobre os arrays do cubo)
+    params = {k: v for k, v in locals().items() if k.startswith("min_") or k.startswith("max_") or k=="risk_level"}
+    flt = compile_filters(params)
+    idx = np.flatnonzero(cube.filter_mask(flt, d))
+    if fmt == "arrow":
+        _require_format(fmt)
+        cols = {k: v[idx] for k, v in cube.columns(d).items()}
+        return Response(arrow_ipc_bytes(pd.DataFrame(cols)), media_type=MEDIA_TYPES["arrow"])
+    rows = cube.records(d, idx)
+    if fmt == "csv":
+        return PlainTextResponse(pd.DataFrame(rows).to_csv(index=False), media_type=MEDIA_TYPES["csv"])
+    return rows
 
 
 @app.get("/v1/risk/by_bairro/csv")
 def risk_by_bairro_csv(date: Optional[str] = None):
-    rows = risk_by_bairro(date_str=date)
-    df = pd.DataFrame(rows)
-    csv = df.to_csv(index=False)
-    return PlainTextResponse(csv, media_type="text/csv; charset=utf-8")
+    cube = get_snapshot().cube
+    return StreamingResponse(iter_csv([(None, cube, [cube.date_index(date)])]), media_type=MEDIA_TYPES["csv"])
+
+@app.get("/v1/risk/export")
+def risk_export(
+    start: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD)"),
+    end: Optional[str] = Query(None, description="Data final (YYYY-MM-DD)"),
+    city: str = Query("canoas", description="Município(s), separados por vírgula"),
+    fmt: str = Query("csv", alias="format", pattern="^(csv|ndjson)$", description="csv|ndjson"),
+    gzip: int = Query(0, description="1 para comprimir (gzip) em streaming"),
+):
+    """Histórico completo em streaming (um bloco por cidade/data; memória constante)."""
+    cities = list(dict.fromkeys(c.strip().lower() for c in city.split(",") if c.strip()))   # sem repetir, na ordem dada
+    unknown = [c for c in cities if c not in CITY_SNAPSHOTS]
+    if unknown: raise HTTPException(404, detail=f"Município(s) sem dados: {', '.join(unknown)}")
+    parts = []
+    for c in cities:
+        cube = CITY_SNAPSHOTS[c].get().cube
+        parts.append((c, cube, cube.date_range(start, end)))
+
+    body = iter_csv(parts) if fmt == "csv" else iter_ndjson(parts)
+    media = MEDIA_TYPES["csv"] if fmt == "csv" else "application/x-ndjson"
+    filename = f"risk_{'_'.join(cities)}.{fmt}"
+    if gzip:
+        body = gzip_stream(body); media = "application/gzip"; filename += ".gz"
+    return StreamingResponse(body, media_type=media,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
 
 @app.get("/v1/risk/by_bairro/top")
 def risk_top(
     date: Optional[str] = Query(None, description="Data específica (YYYY-MM-DD)"),
     n: int = Query(5, ge=1, le=50)
 ):
-    rows = risk_by_bairro(date_str=date)
-    df = pd.DataFrame(rows)
-    df = df[(df.get("U_valid", True)) & (df["Risk_score"].notna())]
-    df = df.sort_values("Risk_score", ascending=False).head(n)
-    df = df.replace({np.nan: None, np.inf: None, -np.inf: None})  # <-- adiciona aqui
-    return df.to_dict(orient="records")
+    cube = get_snapshot().cube
+    d = cube.date_index(date)
+    return cube.records(d, cube.top(d, n))
+
+@app.get("/v1/risk/series")
+def risk_series(
+    start: Optional[str] = Query(None, description="Data inicial (YYYY-MM-DD); padrão: início do horizonte"),
+    end: Optional[str] = Query(None, description="Data final (YYYY-MM-DD); padrão: fim do horizonte"),
+    bairros: Optional[str] = Query(None, description="Lista separada por vírgula; padrão: todos"),
+):
+    """Horizonte inteiro em layout colunar: um array por bairro alinhado a `dates`."""
+    cube = get_snapshot().cube
+    di = cube.date_range(start, end)
+    if bairros:
+        names = [b.strip() for b in bairros.split(",") if b.strip()]
+        missing = [b for b in names if cube.bairro_index(b) is None]
+        if missing: raise HTTPException(404, detail=f"Bairro(s) não encontrado(s): {', '.join(missing)}")
+        bi = np.array([cube.bairro_index(b) for b in names], dtype=np.int64)
+    else:
+        bi = np.arange(len(cube.bairros))
+
+    score = cube.score[np.ix_(di, bi)]
+    levels = np.asarray(LEVELS, dtype=object)[cube.level[np.ix_(di, bi)]]
+    score = np.where(np.isfinite(score), np.round(score, 4), np.nan)
+    out = {}
+    for j, b in enumerate(bi):
+        out[cube.bairros[b]] = {
+            "U": float(cube.U[b]), "U_valid": bool(cube.valid[b]),
+            **({"H_score": [round(float(h), 4) for h in cube.H[di, b]]} if cube.local_hazard else {}),
+            "Risk_score": [None if np.isnan(x) else x for x in score[:, j].tolist()],
+            "Risk_level": levels[:, j].tolist(),
+        }
+    return {
+        "city": "canoas",
+        "dates": [cube.dates[i] for i in di],
+        "H_score": [round(float(h), 4) for h in cube.H_city[di]],
+        "bairros": out,
+    }
 
 # --------------------------- Mapa GeoJSON por data ----------------------------
 
+# respostas GeoJSON completas por (data, include, versão do snapshot)
+GEO_CACHE = BytesLRU(maxsize=int(os.getenv("GEO_CACHE_SIZE", "64")))
+
+def _cached_response(cache: BytesLRU, key, render, media_type: str, if_none_match: Optional[str]) -> Response:
+    hit = cache.get(key)
+    body, etag = hit if hit is not None else cache.put(key, render())
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 @app.get("/v1/geo/canoas/bairros_risk")
 def geo_bairros_risk(
     date: Optional[str] = None,
-    include: Optional[str] = Query("basic", description="basic|infra|hazard|all")
+    include: Optional[str] = Query("basic", description="basic|infra|hazard|all"),
+    detail: str = Query("full", pattern="^(full|medium|low)$", description="full|medium|low (geometria simplificada)"),
+    precision: Optional[int] = Query(None, ge=0, le=15, description="casas decimais das coordenadas"),
+    fmt: str = Query("geojson", alias="format", pattern="^(geojson|topojson|fgb|arrow)$",
+                     description="geojson|topojson|fgb|arrow"),
+    if_none_match: Optional[str] = Header(None),
 ):
-    dfH = try_load_hazard(); dfU, gdfU = try_load_u(); thr = load_weights()["hazard_levels"]
-    df_sel = dfH if date is None else dfH[dfH["date"].dt.date == pd.to_datetime(date).date()]
-    if df_sel.empty: df_sel = dfH[dfH["date"]==dfH["date"].max()]
-    H = float(df_sel["H_score"].iloc[0]); d_sel = df_sel["date"].iloc[0]
-
-    df = dfU.copy(); df["U"] = df.get("U_t", df.get("U_static", 0)).fillna(0)
-    df["U_valid"] = df["U"] > 0
-    df.loc[~df["U_valid"], ["Risk_score","Risk_level"]] = [np.nan,"no_data"]
-    dfv = df[df["U_valid"]].copy()
-    dfv["Fragilidade"] = 1 - dfv["U"]
-    dfv["Risk_score"] = (H * dfv["Fragilidade"]).clip(0,1)
-    dfv["Risk_level"] = dfv["Risk_score"].apply(lambda x: bucket_risk(x, thr))
-    df.update(dfv)
-
-    # Seleção de propriedades
-    base_cols = ["bairro","U","U_valid","Risk_score","Risk_level"]
-    infra_cols = ["u_cobertura","u_micro","u_macro","u_permeabilidade",
-                  "dens_pav_km_km2","dreno_km_km2","canal_km_km2","frac_verde","pumps_n","area_km2"]
-    hazard_cols = ["p6_pct","a72_pct","sm_norm","et_deficit","p1_pct","pp_unit","rd_norm"]
-    # replica hazard cols se existirem
-    rowH = dfH[dfH["date"]==d_sel].head(1)
-    for k in hazard_cols:
-        if k in rowH.columns:
-            df[k] = float(rowH.iloc[0][k]) if pd.notna(rowH.iloc[0][k]) else np.nan
-        else:
-            if k in df.columns: df.drop(columns=[k], inplace=True)
-
-    if include == "basic": props = base_cols
-    elif include == "infra": props = list(dict.fromkeys(base_cols + infra_cols))
-    elif include == "hazard": props = list(dict.fromkeys(base_cols + [c for c in hazard_cols if c in df.columns]))
-    else: props = list(dict.fromkeys(base_cols + infra_cols + [c for c in hazard_cols if c in df.columns]))
-
-    gdf = gdfU.merge(df[["bairro"] + [c for c in props if c != "bairro"]], on="bairro", how="left")
-    gdf["date"] = d_sel.date().isoformat()
-    # garante 'date' em string
-    if "date" in gdf.columns: gdf["date"] = gdf["date"].astype(str)
-    gj = json.loads(gdf[props + ["date","geometry"]].to_json())
-    return gj
+    _require_format(fmt)
+    snap = get_snapshot(); cube = snap.cube
+    d = cube.date_index(date); inc = normalize_include(include)
+    key = (cube.dates[d], inc, detail, precision, fmt, snap.version)
+    render = lambda: snap.geo_features.render_as(fmt, cube, d, inc, detail, precision)
+    return _cached_response(GEO_CACHE, key, render, MEDIA_TYPES[fmt], if_none_match)
+
+# ----------------------------- Vector tiles (MVT) -----------------------------
+
+# tiles renderizados por (versão do snapshot, data, z, x, y)
+TILE_CACHE = BytesLRU(maxsize=int(os.getenv("TILE_CACHE_SIZE", "2048")))
+
+@app.get("/v1/tiles/{date}/{z}/{x}/{y}.mvt")
+def risk_tile(
+    date: str,
+    z: int = PathParam(..., ge=0, le=22),
+    x: int = PathParam(..., ge=0),
+    y: int = PathParam(..., ge=0),
+    if_none_match: Optional[str] = Header(None),
+):
+    if x >= (1 << z) or y >= (1 << z):
+        raise HTTPException(404, detail=f"Tile {z}/{x}/{y} fora da grade.")
+    snap = get_snapshot(); cube = snap.cube
+    try:
+        d = cube.date_index(date)
+    except (ValueError, OverflowError):   # DateParseError do pandas é ValueError
+        raise HTTPException(404, detail=f"Data inválida: '{date}'.")
+    key = (snap.version, cube.dates[d], z, x, y)
+    return _cached_response(TILE_CACHE, key, lambda: snap.geo_features.render_tile(cube, d, z, x, y),
+                            MVT_MEDIA_TYPE, if_none_match)
 
 # --------------------------- Detalhe de um bairro -----------------------------
 
@@ -469,40 +693,44 @@ def geo_bairros_risk(
 def bairro_detail(
     bairro: str,
     date: Optional[str] = None,
-    dynamic: int = Query(0, description="1 para tentar recalcular U(t) com Open-Meteo")
+    dynamic: int = Query(0, description="1 para recalcular U(t) com a grade de dryness (Open-Meteo)")
 ):
-    dfH = try_load_hazard(); dfU, gdfU = try_load_u(); thr = load_weights()["hazard_levels"]
-    df_sel = dfH if date is None else dfH[dfH["date"].dt.date == pd.to_datetime(date).date()]
-    if df_sel.empty: df_sel = dfH[dfH["date"]==dfH["date"].max()]
-    H = float(df_sel["H_score"].iloc[0]); d_sel = df_sel["date"].iloc[0]
-
-    rowU = dfU[dfU["bairro"].astype(str)==str(bairro)].head(1)
-    if rowU.empty: raise HTTPException(404, detail=f"Bairro '{bairro}' não encontrado.")
-    U = float(rowU.get("U_t", rowU.get("U_static", 0)).iloc[0] or 0.0)
-    # opcional: recálculo dinâmico via Open‑Meteo
+    snap = get_snapshot(); cube = snap.cube; thr = snap.thresholds
+    d = cube.date_index(date); d_iso = cube.dates[d]
+
+    b = cube.bairro_index(bairro)
+    if b is None: raise HTTPException(404, detail=f"Bairro '{bairro}' não encontrado.")
+    H = float(cube.H[d, b]); U = float(cube.U[b])
+    # opcional: U(t) da grade de dryness pré-calculada (sem rede aqui)
     used_dynamic = False; dyn_info = {"sm_norm":None, "et_scaled":None, "dryness":None}
-    if dynamic and OM_AVAILABLE and U > 0:
-        rowG = gdfU[gdfU["bairro"].astype(str)==str(bairro)].head(1)
-        if not rowG.empty:
-            c = rowG.iloc[0].geometry.centroid
-            res = compute_dryness_for_date(float(c.y), float(c.x), d_sel)
-            if res["dryness"] is not None:
-                U_static = float(rowU.get("U_static", rowU.get("U_t", 0)).iloc[0] or 0.0)
-                U = float(np.clip(U_static + 0.10*(res["dryness"] - 0.5), 0, 1))
-                used_dynamic = True; dyn_info = res
+    if dynamic and U > 0:
+        DRYNESS.request()   # 1º pedido inicia a grade em segundo plano
+        grid = DRYNESS.get()
+        U_dyn = _dynamic_u(snap, grid) if grid is not None else None
+        c = snap.geom.centroid(bairro)
+        if U_dyn is not None and c is not None and np.isfinite(U_dyn[d, b]):
+            res = grid.lookup(c[0], c[1], d_iso)
+            U = float(U_dyn[d, b])
+            used_dynamic = True
+            dyn_info = {k: res[k] for k in ("sm_norm", "et_scaled", "dryness")}
+        else:
+            dyn_info["reason"] = DRYNESS_REASONS[DRYNESS.status() if U_dyn is None else "outside"]
 
     if U == 0 or pd.isna(U):
-        return {"bairro": bairro, "date": d_sel.date().isoformat(), "status": "no_data"}
+        return {"bairro": bairro, "date": d_iso, "status": "no_data"}
 
-    Frag = float(np.clip(1.0 - U, 0, 1)); Risk = float(np.clip(H * Frag, 0, 1))
-    level = bucket_risk(Risk, thr)
+    Frag = float(np.clip(1.0 - U, 0, 1))
+    if used_dynamic:
+        Risk = float(np.clip(H * Frag, 0, 1)); level = bucket_risk(Risk, thr)
+    else:
+        Risk = float(cube.score[d, b]); level = LEVELS[cube.level[d, b]]
 
-    subs = {k: float(rowU.iloc[0][k]) for k in ["u_cobertura","u_micro","u_macro","u_permeabilidade"] if k in rowU.columns}
-    metrics = {k: (float(rowU.iloc[0][k]) if k in rowU.columns and pd.notna(rowU.iloc[0][k]) else None)
-               for k in ["dens_pav_km_km2","dreno_km_km2","canal_km_km2","frac_verde","pumps_n","area_km2"]}
+    subs = {k: float(cube.static[k][b]) for k in U_SUBINDICES if k in cube.static}
+    metrics = {k: (float(cube.static[k][b]) if k in cube.static and pd.notna(cube.static[k][b]) else None)
+               for k in INFRA_METRICS}
 
     return {
-        "city":"canoas", "bairro":bairro, "date": d_sel.date().isoformat(),
+        "city":"canoas", "bairro":bairro, "date": d_iso,
         "H_score": H, "U": U, "Fragilidade": Frag, "Risk_score": Risk, "Risk_level": level,
         "dynamic_used": used_dynamic, "dynamic_info": dyn_info,
         "u_subindices": subs, "infra_metrics": metrics
@@ -542,40 +770,38 @@ def insights_by_bairro(
     max_actions: int = Query(5, ge=1, le=10),
     include_raw: int = Query(0, description="1 para incluir os dados usados (RAG)"),
 ):
-    # Data base
-    dfH = try_load_hazard(); dfU, _ = try_load_u(); thr = load_weights()["hazard_levels"]
-    df_sel = dfH if date is None else dfH[dfH["date"].dt.date == pd.to_datetime(date).date()]
-    if df_sel.empty: df_sel = dfH[dfH["date"]==dfH["date"].max()]
-    H = float(df_sel["H_score"].iloc[0]); d_sel = df_sel["date"].iloc[0]
-
-    rowU = dfU[dfU["bairro"].astype(str)==str(bairro)].head(1)
-    if rowU.empty: raise HTTPException(404, detail=f"Bairro '{bairro}' não encontrado.")
-    U = float(rowU.get("U_t", rowU.get("U_static", 0)).iloc[0] or 0.0)
-    if U == 0 or pd.isna(U):
-        return {"bairro": bairro, "date": d_sel.date().isoformat(), "status": "no_data"}
+    head, context = _bairro_insight_head(get_snapshot(), bairro, date)
+    if context is None:
+        return head
+    insight = _call_llm_insight(OPENAI_MODEL, _playbook_text(), context,
+                                _insight_schema(max_actions=max_actions, lang=lang), lang)
 
-    Frag = float(np.clip(1.0 - U, 0, 1)); Risk = float(np.clip(H * Frag, 0, 1))
-    level = bucket_risk(Risk, thr)
+    payload = {**head, "insight": insight}
+    if include_raw: payload["inputs"] = context
+    return JSONResponse(payload)
 
-    pop_map = _load_population(); pop_est = pop_map.get(str(bairro))
-    exposure = round(pop_est * Risk) if pop_est is not None else None
+@app.get("/v1/insights/by_bairro/stream")
+async def insights_by_bairro_stream(
+    bairro: str,
+    date: Optional[str] = None,
+    lang: str = Query("pt-BR"),
+    max_actions: int = Query(5, ge=1, le=10),
+    include_raw: int = Query(0, description="1 para incluir os dados usados (RAG)"),
+):
+    """Mesmo conteúdo de /v1/insights/by_bairro em SSE: meta -> delta* -> done."""
+    head, context = _bairro_insight_head(await asyncio.to_thread(get_snapshot), bairro, date)
+    if context is None:
+        return StreamingResponse(iter([sse("done", head)]), media_type="text/event-stream", headers=SSE_HEADERS)
+    client = _get_async_openai_client()
+    messages = _insight_messages(_playbook_text(), context, _insight_schema(max_actions=max_actions, lang=lang), lang)
 
-    client = _get_openai_client()
-    rag_text = _playbook_text()
-    schema = _insight_schema(max_actions=max_actions, lang=lang)
-    context = _build_bairro_context(rowU.iloc[0], H, level, d_sel.date().isoformat(), pop_est)
-    insight = _call_llm_insight(client, OPENAI_MODEL, rag_text, context, schema, lang)
+    def finish(insight: dict) -> dict:
+        payload = {**head, "insight": insight}
+        if include_raw: payload["inputs"] = context
+        return payload
 
-    payload = {
-        "city": "canoas",
-        "bairro": bairro,
-        "date": d_sel.date().isoformat(),
-        "risk": {"score": round(Risk,3), "level": level},
-        "population": {"estimate": pop_est, "exposure_estimate": exposure},
-        "insight": insight
-    }
-    if include_raw: payload["inputs"] = context
-    return JSONResponse(payload)
+    body = stream_insight(client, OPENAI_MODEL, messages, INSIGHTS, head, _fallback_insight(lang), finish)
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
 
 @app.get("/v1/insights/city_top")
 def insights_city_top(
@@ -587,27 +813,23 @@ def insights_city_top(
     if not rows:
         return {"date": date, "items": [], "note": "sem dados para a data ou todos os bairros no_data"}
 
-    client = _get_openai_client()
-    rag = textwrap.dedent("""
-    Objetivo: síntese para decisão operacional municipal.
-    - Liste os bairros em ordem de risco com pontuação.
-    - Recomende alocação de equipes e ações emergenciais rápidas.
-    - Texto curto (<= 1200 caracteres).
-    """)
-    ctx = {"date": rows[0]["date"], "items": rows}
-    schema = {"type":"object","properties":{
-        "language":{"type":"string"},
-        "summary":{"type":"string"},
-        "prioritized_allocation":{"type":"array","items":{"type":"string"}}
-    }, "required":["language","summary","prioritized_allocation"]}
-    sys = f"Você é analista de operações municipais. Responda em {lang}. Devolva SOMENTE JSON."
-    usr = {"role":"user","content": f"RAG:\n{rag}\n\nDATA:\n{json.dumps(ctx, ensure_ascii=False)}\n\nSCHEMA:\n{json.dumps(schema)}"}
-    resp = client.chat.completions.create(
-        model=OPENAI_MODEL,
-        messages=[{"role":"system","content":sys}, usr],
-        temperature=0.2,
-        response_format={"type":"json_object"}
-    )
-    try: out = json.loads(resp.choices[0].message.content)
-    except Exception: out = {"language": lang, "summary":"", "prioritized_allocation":[]}
-    return JSONResponse({"date": ctx["date"], "n": len(rows), "insight": out, "items": rows})
+    out = _city_top_insight(rows, lang)
+    return JSONResponse({"date": rows[0]["date"], "n": len(rows), "insight": out, "items": rows})
+
+@app.get("/v1/insights/city_top/stream")
+async def insights_city_top_stream(
+    date: Optional[str] = None,
+    n: int = Query(5, ge=1, le=10),
+    lang: str = Query("pt-BR")
+):
+    """Mesmo conteúdo de /v1/insights/city_top em SSE: meta -> delta* -> done."""
+    rows = await asyncio.to_thread(risk_top, date=date, n=n)
+    if not rows:
+        empty = {"date": date, "items": [], "note": "sem dados para a data ou todos os bairros no_data"}
+        return StreamingResponse(iter([sse("done", empty)]), media_type="text/event-stream", headers=SSE_HEADERS)
+    client = _get_async_openai_client()
+    meta = {"date": rows[0]["date"], "n": len(rows), "items": rows}
+    body = stream_insight(client, OPENAI_MODEL, _city_top_messages(rows, lang), INSIGHTS, meta,
+                          {"language": lang, "summary":"", "prioritized_allocation":[]},
+                          lambda out: {"date": meta["date"], "n": len(rows), "insight": out, "items": rows})
+    return StreamingResponse(body, media_type="text/event-stream", headers=SSE_HEADERS)
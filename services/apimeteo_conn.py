@@ -2,28 +2,77 @@
 # ==========================================
 # Open-Meteo: Previsão de Perigo Fluvial (H_score) até 16 dias
 # ==========================================
-import openmeteo_requests
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
 import pandas as pd
 import numpy as np
+import yaml
 import requests_cache
 from retry_requests import retry
 from datetime import date
 
+try:
+    from services.dryness import snap_cells, GRID_DEG
+    from services import storage
+except ImportError:  # executado como script: python services/apimeteo_conn.py
+    from dryness import snap_cells, GRID_DEG
+    import storage
+
 # -----------------------
 # Configuração da API
 # -----------------------
-cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
-retry_session = retry(cache_session, retries=5, backoff_factor=0.3)
-om = openmeteo_requests.Client(session=retry_session)
-
-FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-FLOOD_URL    = "https://flood-api.open-meteo.com/v1/flood"
+# URLs configuráveis (ex.: servidor stub local em testes)
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+FLOOD_URL    = os.getenv("OPEN_METEO_FLOOD_URL", "https://flood-api.open-meteo.com/v1/flood")
+ARCHIVE_URL  = os.getenv("OPEN_METEO_ARCHIVE_URL", "https://archive-api.open-meteo.com/v1/archive")
 TZ = "America/Sao_Paulo"
+HAZARD_DIR = Path(__file__).resolve().parent / "data" / "hazard"
+CLIMATOLOGY_CSV = HAZARD_DIR / "climatology_daily.csv"
+U_GEOJSON = HAZARD_DIR.parent / "u" / "canoas_bairros_u.geojson"
+BATCH_SIZE = int(os.getenv("OPEN_METEO_BATCH", "50"))   # coordenadas por requisição multi-localização
+WEIGHTS_YAML = Path(__file__).resolve().parents[1] / "configs" / "weights.yaml"
+
+_session = None
+
+def om_session():
+    """Sessão HTTP com cache/retry, criada só no primeiro uso (o módulo é importado pela API)."""
+    global _session
+    if _session is None:
+        cache_session = requests_cache.CachedSession('.cache', expire_after=3600)
+        _session = retry(cache_session, retries=5, backoff_factor=0.3)
+    return _session
+
+def _om_json(url: str, params: dict):
+    params = {k: (",".join(map(str, v)) if isinstance(v, list) else v) for k, v in params.items()}
+    r = om_session().get(url, params={**params, "timeformat": "unixtime"}, timeout=60)
+    r.raise_for_status()
+    return r.json()
+
+def om_get(url: str, params: dict) -> dict:
+    data = _om_json(url, params)
+    return data[0] if isinstance(data, list) else data
+
+def om_get_many(url: str, lats: List[float], lons: List[float], params: dict) -> List[dict]:
+    """Uma resposta por coordenada, em lotes de BATCH_SIZE coordenadas por requisição."""
+    out: List[dict] = []
+    for i in range(0, len(lats), BATCH_SIZE):
+        la = [round(float(v), 4) for v in lats[i:i + BATCH_SIZE]]
+        lo = [round(float(v), 4) for v in lons[i:i + BATCH_SIZE]]
+        data = _om_json(url, {**params, "latitude": la, "longitude": lo})
+        out += data if isinstance(data, list) else [data]
+    return out
+
+def _values(block: dict, name: str) -> np.ndarray:
+    # float32, como os valores decodificados do SDK flatbuffers usado antes
+    vals = block.get(name)
+    return np.asarray([np.nan if v is None else v for v in vals], dtype=np.float32)
 
 # -----------------------
 # Local e horizonte
 # -----------------------
-lat, lon = -30.03, -51.22  # Porto Alegre, RS
+lat, lon = -29.92, -51.18  # Canoas, RS (centro)
 forecast_days = 16
 today = str(date.today())
 
@@ -50,32 +99,19 @@ flood_daily_vars = [
 # 1) Previsão horária (meteo)
 # -----------------------
 def fetch_forecast_hourly(lat, lon, forecast_days, variables):
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "forecast_days": forecast_days,
-        "timezone": TZ,
-        "hourly": variables
-    }
-    responses = om.weather_api(FORECAST_URL, params=params)
-    resp = responses[0]
-    hourly = resp.Hourly()
+    return fetch_forecast_hourly_many([lat], [lon], forecast_days, variables)[0]
+
+def fetch_forecast_hourly_many(lats, lons, forecast_days, variables) -> List[pd.DataFrame]:
+    params = {"forecast_days": forecast_days, "timezone": TZ, "hourly": variables}
+    return [_hourly_frame(r.get("hourly", {}), variables) for r in om_get_many(FORECAST_URL, lats, lons, params)]
 
+def _hourly_frame(hourly: dict, variables) -> pd.DataFrame:
     # Cria DataFrame base
-    time_index = pd.date_range(
-        start=pd.to_datetime(hourly.Time(), unit="s", utc=True),
-        end=pd.to_datetime(hourly.TimeEnd(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=hourly.Interval()),
-        inclusive="left"
-    )
-    df = pd.DataFrame({"time": time_index})
-
-    n = hourly.VariablesLength()
-    for i in range(n):
+    df = pd.DataFrame({"time": pd.to_datetime(hourly.get("time", []), unit="s", utc=True)})
+
+    for name in variables:
         try:
-            vals = hourly.Variables(i).ValuesAsNumpy()
-            name = variables[i] if i < len(variables) else f"var_{i}"
-            df[name] = vals
+            df[name] = _values(hourly, name)
         except Exception:
             pass
 
@@ -112,34 +148,27 @@ def fetch_forecast_hourly(lat, lon, forecast_days, variables):
 # 2) Flood API diária (forecast)
 # -----------------------
 def fetch_forecast_flood(lat, lon, forecast_days, variables):
-    params = {
-        "latitude": lat,
-        "longitude": lon,
-        "forecast_days": forecast_days,
-        "timezone": TZ,
-        "daily": variables
-    }
-    responses = om.weather_api(FLOOD_URL, params=params)
-    resp = responses[0]
-    daily = resp.Daily()
-
-    date_index = pd.date_range(
-        start=pd.to_datetime(daily.Time(), unit="s", utc=True),
-        end=pd.to_datetime(daily.TimeEnd(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=daily.Interval()),
-        inclusive="left"
-    ).tz_convert(TZ).date
+    return fetch_forecast_flood_many([lat], [lon], forecast_days, variables)[0]
+
+def fetch_forecast_flood_many(lats, lons, forecast_days, variables) -> List[pd.DataFrame]:
+    params = {"forecast_days": forecast_days, "timezone": TZ, "daily": variables}
+    resps = om_get_many(FLOOD_URL, lats, lons, params)
+    return [_flood_frame(r, variables, la, lo) for r, la, lo in zip(resps, lats, lons)]
+
+def _flood_frame(resp: dict, variables, lat, lon) -> pd.DataFrame:
+    daily = resp.get("daily", {})
+
+    date_index = pd.to_datetime(daily.get("time", []), unit="s", utc=True).tz_convert(TZ).date
 
     out = pd.DataFrame({"date": date_index})
-    for i in range(daily.VariablesLength()):
-        col = variables[i] if i < len(variables) else f"flood_var_{i}"
+    for col in variables:
         try:
-            out[col] = daily.Variables(i).ValuesAsNumpy()
+            out[col] = _values(daily, col)
         except Exception:
             pass
 
-    out["latitude"] = resp.Latitude()
-    out["longitude"] = resp.Longitude()
+    out["latitude"] = np.float32(resp.get("latitude", lat))
+    out["longitude"] = np.float32(resp.get("longitude", lon))
     return out
 
 
@@ -147,58 +176,117 @@ def fetch_forecast_flood(lat, lon, forecast_days, variables):
 # 3) Agregar hora → dia (features diárias)
 # -----------------------
 def daily_features_from_hourly(dfh: pd.DataFrame) -> pd.DataFrame:
+    """
+    Features diárias por data local, num único groupby:
+    p1 = máx. horário, p6 = máx. da soma móvel de 6 h, pp = máx. probabilidade,
+    sm = média da umidade do solo, et24 = soma da ET.
+    """
     dfh = dfh.sort_values("time")
     dfh["date"] = dfh["time_local"].dt.date
     precip = dfh["precipitation"].fillna(0.0)
     roll6 = precip.rolling(window=6, min_periods=1).sum()
 
-    dates = sorted(dfh["date"].unique())
-    rows = []
-    for d in dates:
-        start_local = pd.Timestamp(d).tz_localize(TZ)
-        end_local   = start_local + pd.Timedelta(days=1) - pd.Timedelta(seconds=1)
-        mask_day = (dfh["time_local"] >= start_local) & (dfh["time_local"] <= end_local)
-
-        day_precip = precip[mask_day]
-        p1_mm = float(day_precip.max()) if not day_precip.empty else 0.0
-        p6_mm = float(roll6[mask_day].max()) if mask_day.any() else 0.0
-
-        pp_max = float(dfh.loc[mask_day, "precipitation_probability"].max()/100.0) if "precipitation_probability" in dfh.columns else 0.0
-        sm_mean = float(dfh.loc[mask_day, "soil_moisture_0_to_1cm"].mean()) if "soil_moisture_0_to_1cm" in dfh.columns else 0.5
-        et24 = float(dfh.loc[mask_day, "evapotranspiration"].sum()) if "evapotranspiration" in dfh.columns else np.nan
-
-        rows.append({"date": d, "p1_mm": p1_mm, "p6_mm": p6_mm, "pp_max": pp_max, "sm_mean": sm_mean, "et24_mm": et24})
-    return pd.DataFrame(rows)
+    cols = {"p1_mm": precip, "p6_mm": roll6}
+    aggs = {"p1_mm": "max", "p6_mm": "max"}
+    optional = [("pp_max", "precipitation_probability", "max"),
+                ("sm_mean", "soil_moisture_0_to_1cm", "mean"),
+                ("et24_mm", "evapotranspiration", "sum")]
+    src_dtype = {}
+    for out_col, src, how in optional:
+        if src in dfh.columns:
+            cols[out_col] = dfh[src].astype(float); aggs[out_col] = how
+            src_dtype[out_col] = dfh[src].dtype
+    daily = pd.DataFrame(cols).groupby(dfh["date"], sort=True).agg(aggs)
+    # agregação cython em float64; volta ao dtype de origem (float32 do Open-Meteo),
+    # como a média/soma feitas direto na coluna original
+    daily = daily.astype({c: t for c, t in src_dtype.items() if t.kind == "f"})
+
+    # colunas ausentes na origem: mesmos defaults de antes
+    if "pp_max" in daily: daily["pp_max"] = daily["pp_max"] / 100.0
+    else: daily["pp_max"] = 0.0
+    if "sm_mean" not in daily: daily["sm_mean"] = 0.5
+    if "et24_mm" not in daily: daily["et24_mm"] = np.nan
+
+    daily = daily[["p1_mm", "p6_mm", "pp_max", "sm_mean", "et24_mm"]].astype(float)
+    return daily.rename_axis("date").reset_index()
 
 
 # -----------------------
 # 4) Normalização e H_score
 # -----------------------
-def percentile_norm(series: pd.Series, values: pd.Series) -> pd.Series:
-    arr = np.asarray(series.dropna().values, dtype=float)
-    if arr.size == 0:
-        return pd.Series([np.nan]*len(values), index=values.index)
-    return values.apply(lambda x: float(np.mean(arr <= float(x))) if pd.notna(x) else np.nan)
+def percentile_norm(series, values: pd.Series) -> pd.Series:
+    """
+    Percentil empírico de cada valor no baseline: fração do baseline <= x.
+    Baseline ordenado uma vez + busca binária: O((n + m) log n), serve para
+    climatologias longas (centenas de milhares de valores).
+    """
+    arr = np.sort(pd.Series(series, dtype=float).dropna().to_numpy())
+    vals = np.asarray(values, dtype=float)
+    out = np.full(len(vals), np.nan)
+    if arr.size:
+        ok = ~np.isnan(vals)
+        out[ok] = np.searchsorted(arr, vals[ok], side="right") / arr.size
+    return pd.Series(out, index=values.index)
 
 def scale_deficit(series: pd.Series, lo: float, hi: float) -> pd.Series:
     s = (series - lo) / (hi - lo)
     s = s.clip(lower=0, upper=1)
     return 1.0 - s
 
-def daily_weights(ribeirinho=False):
-    w = {"p6":0.25,"a72":0.25,"sm":0.15,"etd":0.10,"p1":0.10,"pp":0.05}
+DEFAULT_HAZARD_WEIGHTS = {"p6":0.25,"a72":0.25,"sm":0.15,"etd":0.10,"p1":0.10,"pp":0.05,"rd":0.10}
+# termo do H -> coluna de features (a72 usa o mesmo percentil de p6)
+TERM_COLUMNS = {"p6":"p6_pct","a72":"p6_pct","sm":"sm_norm","etd":"et_deficit","p1":"p1_pct","pp":"pp_unit","rd":"rd_norm"}
+
+def load_hazard_weights(path: Path = WEIGHTS_YAML) -> Dict[str, float]:
+    """hazard_daily_weights de configs/weights.yaml (mesmo arquivo lido pela API)."""
+    try:
+        w = (yaml.safe_load(Path(path).read_text(encoding="utf-8")) or {}).get("hazard_daily_weights")
+    except OSError:
+        w = None
+    return {k: float(v) for k, v in (w or DEFAULT_HAZARD_WEIGHTS).items()}
+
+def daily_weights(ribeirinho=False, base: Optional[Dict[str, float]] = None):
+    base = load_hazard_weights() if base is None else base
+    w = {k: v for k, v in base.items() if k != "rd"}
     if ribeirinho:
-        w["rd"] = 0.10
+        w["rd"] = base.get("rd", DEFAULT_HAZARD_WEIGHTS["rd"])
         s = sum(w.values())
         w = {k:v/s for k,v in w.items()}
     return w
 
-def compute_h_score(forecast_df: pd.DataFrame, flood_df: pd.DataFrame):
+def h_score_matrix(terms: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    H para uma matriz de termos (N x K; NaN = indisponível) e pesos (K,) ou cenários (S x K).
+    Pesos renormalizados por linha sobre os termos disponíveis; resultado em [0, 1]
+    com forma (N,) ou (S x N).
+    """
+    terms = np.asarray(terms, dtype=float)
+    w = np.asarray(weights, dtype=float)[..., None, :]
+    avail = ~np.isnan(terms)
+    wa = np.where(avail, w, 0.0)
+    s = wa.sum(axis=-1, keepdims=True)
+    wn = np.divide(wa, s, out=np.zeros(np.broadcast_shapes(wa.shape, s.shape)), where=s > 0)
+    total = np.where(avail, wn * np.nan_to_num(terms), 0.0).sum(axis=-1)
+    return np.clip(total, 0.0, 1.0)
+
+def compute_h_score(forecast_df: pd.DataFrame, flood_df: pd.DataFrame,
+                    climatology: Optional[pd.DataFrame] = None,
+                    weights: Optional[Dict[str, float]] = None):
+    """
+    `climatology` (opcional): série diária histórica (p1_mm, p6_mm, river_discharge)
+    usada como baseline dos percentis no lugar da própria janela de previsão.
+    `weights` (opcional): substitui hazard_daily_weights de configs/weights.yaml.
+    """
     feats = forecast_df.copy()
     p1_base = feats["p1_mm"]; p6_base = feats["p6_mm"]
     sm_base = feats["sm_mean"].fillna(0.5)
     et_base = feats["et24_mm"].dropna() if "et24_mm" in feats else pd.Series(dtype=float)
     rd_base = flood_df["river_discharge"].dropna() if "river_discharge" in flood_df else pd.Series(dtype=float)
+    if climatology is not None:
+        if "p1_mm" in climatology: p1_base = climatology["p1_mm"]
+        if "p6_mm" in climatology: p6_base = climatology["p6_mm"]
+        if "river_discharge" in climatology and not rd_base.empty:
+            rd_base = climatology["river_discharge"].dropna()
 
     feats["p1_pct"] = percentile_norm(p1_base, feats["p1_mm"]).clip(0,1)
     feats["p6_pct"] = percentile_norm(p6_base, feats["p6_mm"]).clip(0,1)
@@ -214,43 +302,134 @@ def compute_h_score(forecast_df: pd.DataFrame, flood_df: pd.DataFrame):
         feats["rd_norm"]=np.nan
         ribeirinho=False
 
-    W=daily_weights(ribeirinho)
-    def row_score(r):
-        weights=W.copy()
-        terms={"p6":r["p6_pct"],"a72":r["p6_pct"],"sm":r["sm_norm"],"etd":r["et_deficit"],
-               "p1":r["p1_pct"],"pp":r["pp_unit"],"rd":r.get("rd_norm",np.nan)}
-        avail={k:pd.notna(terms[k]) for k in weights}
-        s=sum(weights[k] for k in weights if avail[k])
-        weights={k:(weights[k]/s if avail[k] and s>0 else 0.0) for k in weights}
-        total=sum(weights[k]*float(terms[k]) for k in weights if pd.notna(terms[k]))
-        return max(0.0,min(1.0,total))
-    feats["H_score"]=feats.apply(row_score,axis=1)
+    W = daily_weights(ribeirinho, weights)
+    terms = np.column_stack([feats[TERM_COLUMNS[k]].to_numpy(dtype=float) for k in W])
+    feats["H_score"] = h_score_matrix(terms, np.array(list(W.values())))
     return feats
 
 
 # -----------------------
-# Execução principal
+# 5) Pipeline completo + escrita atômica
 # -----------------------
-if __name__=="__main__":
-    print("🌦️ Baixando previsão de 16 dias da Open-Meteo...")
-    wx_hourly = fetch_forecast_hourly(lat, lon, forecast_days, hourly_vars)
-    flood_daily = fetch_forecast_flood(lat, lon, forecast_days, flood_daily_vars)
+def build_climatology(lat: float, lon: float, start: str, end: str,
+                      out: Path = CLIMATOLOGY_CSV) -> pd.DataFrame:
+    """
+    Baseline histórico diário (reanálise ERA5 via archive API + vazão histórica do Flood API)
+    no mesmo formato das features da previsão: date, p1_mm, p6_mm, river_discharge.
+    """
+    base = {"latitude": lat, "longitude": lon, "timezone": TZ, "start_date": start, "end_date": end}
+    hourly = om_get(ARCHIVE_URL, {**base, "hourly": ["precipitation"]}).get("hourly", {})
+    dfh = pd.DataFrame({"time": pd.to_datetime(hourly.get("time", []), unit="s", utc=True),
+                        "precipitation": _values(hourly, "precipitation")})
+    dfh["time_local"] = dfh["time"].dt.tz_convert(TZ)
+    clim = daily_features_from_hourly(dfh)[["date", "p1_mm", "p6_mm"]]
+
+    daily = om_get(FLOOD_URL, {**base, "daily": ["river_discharge"]}).get("daily", {})
+    if daily.get("time"):
+        flood = pd.DataFrame({"date": pd.to_datetime(daily["time"], unit="s", utc=True).tz_convert(TZ).date,
+                              "river_discharge": _values(daily, "river_discharge")})
+        clim = clim.merge(flood, on="date", how="outer")
+    storage.write_table(clim, Path(out))
+    return clim
+
+def load_climatology(path: Path = CLIMATOLOGY_CSV) -> Optional[pd.DataFrame]:
+    return storage.read_table(path) if storage.exists(path) else None
+
+def bairro_points(path: Path = U_GEOJSON) -> Optional[pd.DataFrame]:
+    """Centróides (bairro, lat, lon) dos polígonos de U; None se o GeoJSON não existe."""
+    src = storage.resolve(path)
+    if src is None:
+        return None
+    try:
+        from services.geometry_store import geometry_store_for
+    except ImportError:
+        from geometry_store import geometry_store_for
+    gdf = storage.read_geo(path)
+    store = geometry_store_for(src, gdf["bairro"].astype(str).tolist(), gdf.geometry.values)
+    return pd.DataFrame({"bairro": store.bairros, "lat": store.lat, "lon": store.lon})
+
+def hazard_by_location(wx: List[pd.DataFrame], flood: List[pd.DataFrame],
+                       climatology: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    """Tabela longa (loc, date, features..., H_score): features e H de cada local, com percentis por local."""
+    parts = []
+    for i, (h, f) in enumerate(zip(wx, flood)):
+        feats = compute_h_score(daily_features_from_hourly(h), f, climatology)
+        feats.insert(0, "loc", i)
+        parts.append(feats)
+    return pd.concat(parts, ignore_index=True)
+
+def run_pipeline(out_dir: Path = HAZARD_DIR, lat: float = lat, lon: float = lon,
+                 forecast_days: int = forecast_days, points: Optional[pd.DataFrame] = None,
+                 step: float = GRID_DEG) -> Dict[str, pd.DataFrame]:
+    """
+    fetch -> daily_features_from_hourly -> compute_h_score e grava os CSVs.
+    Com `points` (bairro, lat, lon; padrão: centróides do GeoJSON de U) também calcula H por
+    bairro: centróides agrupados em células de `step` graus, ponto da cidade + células numa
+    única requisição multi-coordenada por API -> hazard_by_bairro.csv (bairro x data).
+    hazard_forecast.csv (o arquivo observado pela API) é gravado por último.
+    Se existir climatology_daily.csv em out_dir, ele é o baseline dos percentis.
+    """
+    out_dir = Path(out_dir)
+    clim = load_climatology(out_dir / CLIMATOLOGY_CSV.name)
+    if points is None:
+        points = bairro_points()
+
+    lats, lons = [lat], [lon]
+    if points is not None and len(points):
+        cells, cell_of = snap_cells(points["lat"], points["lon"], step)
+        lats += cells[:, 0].tolist(); lons += cells[:, 1].tolist()
+    wx = fetch_forecast_hourly_many(lats, lons, forecast_days, hourly_vars)
+    fl = fetch_forecast_flood_many(lats, lons, forecast_days, flood_daily_vars)
+
+    wx_hourly, flood_daily = wx[0], fl[0]
+    feats = compute_h_score(daily_features_from_hourly(wx_hourly), flood_daily, clim)
+    merged = flood_daily.merge(feats,on="date",how="left")
 
-    print("📅 Gerando features diárias e H_score...")
-    feats = daily_features_from_hourly(wx_hourly)
-    feats = compute_h_score(feats, flood_daily)
+    by_bairro = None
+    if len(lats) > 1:
+        table = hazard_by_location(wx[1:], fl[1:], clim)
+        table.insert(1, "cell_lat", cells[table["loc"], 0].round(4))
+        table.insert(2, "cell_lon", cells[table["loc"], 1].round(4))
+        pts = pd.DataFrame({"bairro": points["bairro"].to_numpy(), "loc": cell_of})
+        by_bairro = (pts.merge(table, on="loc", how="left").drop(columns="loc")
+                     .sort_values(["date", "bairro"], kind="stable").reset_index(drop=True))
+
+    # Parquet (ou CSV, conforme DATA_FORMAT/DATA_EXPORT_CSV); hazard_forecast por último:
+    # a API só recarrega quando ele muda, então lê hazard_by_bairro já atualizado
+    storage.write_table(wx_hourly, out_dir / "weather_forecast_hourly.csv")
+    storage.write_table(flood_daily, out_dir / "flood_forecast.csv")
+    storage.write_table(merged, out_dir / "flood_weather_hazard_forecast.csv")
+    if by_bairro is not None:
+        storage.write_table(by_bairro, out_dir / "hazard_by_bairro.csv")
+    storage.write_table(feats, out_dir / "hazard_forecast.csv")
+    return {"hourly": wx_hourly, "flood": flood_daily, "hazard": feats, "merged": merged, "by_bairro": by_bairro}
 
-    wx_hourly.to_csv("./data/hazard/weather_forecast_hourly.csv",index=False)
-    feats.to_csv("./data/hazard/hazard_forecast.csv",index=False)
-    flood_daily.to_csv("./data/hazard/flood_forecast.csv",index=False)
 
-    merged = flood_daily.merge(feats,on="date",how="left")
-    merged.to_csv("./data/hazard/flood_weather_hazard_forecast.csv",index=False)
+# -----------------------
+# Execução principal
+# -----------------------
+if __name__=="__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="Previsão de perigo (H_score) via Open-Meteo")
+    ap.add_argument("--city-only", action="store_true", help="só o ponto da cidade (sem hazard_by_bairro.csv)")
+    ap.add_argument("--climatology", nargs=2, metavar=("INICIO", "FIM"),
+                    help="gera o baseline histórico (YYYY-MM-DD YYYY-MM-DD) em climatology_daily.csv antes da previsão")
+    args = ap.parse_args()
+    if args.climatology:
+        print(f"📚 Baixando climatologia {args.climatology[0]} → {args.climatology[1]}...")
+        clim = build_climatology(lat, lon, *args.climatology)
+        print(f"   {len(clim)} dias em {storage.resolve(CLIMATOLOGY_CSV)}")
 
-    print("✅ Arquivos salvos:")
-    print(" - weather_forecast_hourly.csv")
-    print(" - flood_forecast.csv")
-    print(" - hazard_forecast.csv")
-    print(" - flood_weather_hazard_forecast.csv")
+    print("🌦️ Baixando previsão de 16 dias da Open-Meteo...")
+    print("📅 Gerando features diárias e H_score...")
+    out = run_pipeline(points=pd.DataFrame(columns=["bairro", "lat", "lon"]) if args.city_only else None)
+    merged = out["merged"]
+
+    print(f"✅ Arquivos salvos em {HAZARD_DIR}:")
+    for name in ["weather_forecast_hourly.csv", "flood_forecast.csv", "hazard_forecast.csv",
+                 "flood_weather_hazard_forecast.csv"]:
+        print(f" - {storage.resolve(HAZARD_DIR / name).name}")
+    if out["by_bairro"] is not None:
+        print(f" - {storage.resolve(HAZARD_DIR / 'hazard_by_bairro.csv').name} ({out['by_bairro']['bairro'].nunique()} bairros)")
     print("\nPrévia:")
     print(merged[["date","river_discharge","p6_mm","pp_max","H_score"]].head())
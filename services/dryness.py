@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Grade de dryness (umidade do solo + ET) pré-calculada para Canoas.
+
+- Os centróides dos bairros são "snapados" para uma grade regular (GRID_DEG graus,
+  próxima da resolução do Open-Meteo): bairros na mesma célula compartilham a série.
+- Todas as células são buscadas numa única requisição multi-localização e reduzidas
+  a matrizes (data x célula) de sm_norm, et_scaled e dryness.
+- U(t) = clamp(U_static + DELTA_DRYNESS*(dryness - 0.5)) sai por broadcasting
+  para qualquer conjunto de bairros/datas, sem rede no caminho da requisição.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+GRID_DEG = float(os.getenv("DRYNESS_GRID_DEG", "0.1"))
+HOURLY_VARS = ["evapotranspiration", "soil_moisture_0_to_1cm"]
+SM_RANGE = (0.10, 0.45)   # umidade do solo (m3/m3)
+ET_RANGE = (1.0, 6.0)     # ET diária (mm)
+DELTA_DRYNESS = 0.10      # ganho dinâmico
+
+
+def _cell_keys(lat, lon, step: float) -> np.ndarray:
+    return np.column_stack([np.round(np.asarray(lat, dtype=float) / step),
+                            np.round(np.asarray(lon, dtype=float) / step)]).astype(np.int64)
+
+
+def snap_cells(lat, lon, step: float = GRID_DEG) -> Tuple[np.ndarray, np.ndarray]:
+    """Células únicas (lat, lon do centro) e o índice da célula de cada ponto."""
+    uniq, inverse = np.unique(_cell_keys(lat, lon, step), axis=0, return_inverse=True)
+    return uniq * step, inverse.reshape(-1)
+
+
+def _scale(x: np.ndarray, lo: float, hi: float) -> np.ndarray:
+    if hi == lo:
+        return np.where(np.isnan(x), np.nan, 0.0)
+    return np.clip((x - lo) / (hi - lo), 0.0, 1.0)
+
+
+def dynamic_u(U_static, dryness):
+    """U(t) a partir de U_static e dryness (escalares ou arrays com broadcasting)."""
+    return np.clip(U_static + DELTA_DRYNESS * (dryness - 0.5), 0.0, 1.0)
+
+
+def daily_dryness(dates: np.ndarray, et: Optional[np.ndarray], sm: Optional[np.ndarray]):
+    """
+    Agrega as séries horárias (célula x hora) por dia local:
+    ET = soma do dia, SM = média das últimas 6 h do dia (NaN ignorado, como no pandas).
+    Retorna (datas, et24, sm6) com matrizes (data x célula).
+    """
+    uniq, starts = np.unique(dates, return_index=True)
+    order = np.argsort(starts); uniq, starts = uniq[order], starts[order]
+    ends = np.append(starts[1:], len(dates))
+    n = (et if et is not None else sm).shape[0]
+
+    et24 = np.full((len(uniq), n), np.nan)
+    if et is not None:
+        et24 = np.add.reduceat(np.nan_to_num(et), starts, axis=1).T
+    sm6 = np.full((len(uniq), n), np.nan)
+    if sm is not None:
+        for i, (s, e) in enumerate(zip(starts, ends)):
+            win = sm[:, max(s, e - 6):e]
+            cnt = np.sum(~np.isnan(win), axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                sm6[i] = np.where(cnt > 0, np.nansum(win, axis=1) / cnt, np.nan)
+    return [str(d) for d in uniq], et24, sm6
+
+
+@dataclass(frozen=True)
+class DrynessGrid:
+    step: float
+    cells: np.ndarray               # (N, 2) lat/lon do centro da célula
+    cell_pos: Dict[Tuple[int, int], int]
+    dates: List[str]                # ISO, datas locais
+    date_pos: Dict[str, int]
+    et24: np.ndarray                # (D, N) mm
+    sm6: np.ndarray                 # (D, N) m3/m3
+    sm_norm: np.ndarray             # (D, N)
+    et_scaled: np.ndarray           # (D, N)
+    dryness: np.ndarray             # (D, N); NaN se sm ou ET ausente
+    fetched_at: float
+
+    def cell_index(self, lat, lon) -> np.ndarray:
+        """Célula de cada ponto (-1 se fora da grade buscada)."""
+        lat, lon = np.atleast_1d(np.asarray(lat, dtype=float)), np.atleast_1d(np.asarray(lon, dtype=float))
+        ok = np.isfinite(lat) & np.isfinite(lon)
+        keys = _cell_keys(np.where(ok, lat, 0.0), np.where(ok, lon, 0.0), self.step)
+        return np.array([self.cell_pos.get(tuple(k), -1) if v else -1 for k, v in zip(keys.tolist(), ok)],
+                        dtype=np.int64)
+
+    def lookup(self, lat: float, lon: float, date_iso: str) -> Optional[Dict[str, Any]]:
+        d = self.date_pos.get(date_iso)
+        c = int(self.cell_index(lat, lon)[0])
+        if d is None or c < 0:
+            return None
+        f = lambda a: None if np.isnan(a[d, c]) else float(a[d, c])
+        return {"sm_norm": f(self.sm_norm), "et_scaled": f(self.et_scaled), "dryness": f(self.dryness),
+                "et24_mm": f(self.et24), "sm6_m3m3": f(self.sm6)}
+
+    def u_dynamic(self, U_static: np.ndarray, cell_idx: np.ndarray) -> np.ndarray:
+        """U(t) (data x ponto) para todos os pontos; NaN onde não há célula/dryness."""
+        dry = np.where(cell_idx >= 0, self.dryness[:, np.maximum(cell_idx, 0)], np.nan)
+        return dynamic_u(np.asarray(U_static, dtype=float)[None, :], dry)
+
+    def u_for(self, dates: List[str], lat, lon, U_static) -> np.ndarray:
+        """U(t) (len(dates) x ponto) nos eixos pedidos (ex.: datas do cubo); NaN fora da grade."""
+        U = self.u_dynamic(U_static, self.cell_index(lat, lon))
+        d = np.array([self.date_pos.get(x, -1) for x in dates], dtype=np.int64)
+        return np.where((d >= 0)[:, None], U[np.maximum(d, 0)], np.nan)
+
+
+async def fetch_grid(client, lat, lon, step: float = GRID_DEG,
+                     past_days: int = 2, forecast_days: int = 16) -> DrynessGrid:
+    """Busca todas as células dos pontos (lat, lon) numa única chamada multi-localização."""
+    cells, _ = snap_cells(lat, lon, step)
+    keys = _cell_keys(cells[:, 0], cells[:, 1], step)
+    frames = await client.hourly_many(cells[:, 0].tolist(), cells[:, 1].tolist(), HOURLY_VARS,
+                                      past_days=past_days, forecast_days=forecast_days)
+    stack = lambda v: np.vstack([f[v].to_numpy(dtype=float) for f in frames]) if v in frames[0] else None
+    dates, et24, sm6 = daily_dryness(frames[0]["date"].to_numpy(), stack("evapotranspiration"),
+                                     stack("soil_moisture_0_to_1cm"))
+    sm_norm = _scale(sm6, *SM_RANGE)
+    et_scaled = _scale(et24, *ET_RANGE)
+    dryness = np.clip(0.5 * (1.0 - sm_norm) + 0.5 * et_scaled, 0.0, 1.0)
+    return DrynessGrid(step=step, cells=cells, cell_pos={tuple(k): i for i, k in enumerate(keys.tolist())},
+                       dates=dates, date_pos={d: i for i, d in enumerate(dates)},
+                       et24=et24, sm6=sm6, sm_norm=sm_norm, et_scaled=et_scaled, dryness=dryness,
+                       fetched_at=time.time())
+
+
+class DrynessStore:
+    """
+    Grade corrente, trocada atomicamente a cada refresh. Leitores só acessam `get()`
+    (memória); a rede fica no laço `run()` em segundo plano, que só começa quando a
+    grade é pedida pela primeira vez (`request()`), salvo `lazy=False`.
+    """
+
+    def __init__(self, client, step: float = GRID_DEG, interval: float = 3600.0):
+        self.client = client
+        self.step = step
+        self.interval = interval
+        self._grid: Optional[DrynessGrid] = None
+        self._u: Optional[Tuple[Any, np.ndarray]] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wanted: Optional[asyncio.Event] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 0
+
+    def get(self) -> Optional[DrynessGrid]:
+        return self._grid
+
+    def status(self) -> str:
+        if self._grid is not None:
+            return "ready"
+        if not self.enabled or self._loop is None:
+            return "disabled"
+        return "loading"
+
+    def request(self) -> None:
+        """Pede a grade (ex.: primeiro `dynamic=1`); pode ser chamado de qualquer thread."""
+        if self._loop is not None and self._wanted is not None and not self._wanted.is_set():
+            self._loop.call_soon_threadsafe(self._wanted.set)
+
+    def u_matrix(self, grid: DrynessGrid, key, dates: List[str], lat, lon, U_static) -> np.ndarray:
+        """
+        U(t) vetorizado (data x bairro) de `grid`, calculado uma vez por (grade, `key`),
+        ex.: versão do snapshot.
+        """
+        cached = self._u
+        if cached is not None and cached[0] == (id(grid), key):
+            return cached[1]
+        U = grid.u_for(dates, lat, lon, U_static)
+        U.setflags(write=False)
+        self._u = ((id(grid), key), U)
+        return U
+
+    async def refresh(self, points: Callable[[], Tuple[np.ndarray, np.ndarray]]) -> Optional[DrynessGrid]:
+        try:
+            lat, lon = await asyncio.to_thread(points)   # pode reconstruir o snapshot: fora do event loop
+            if len(lat) == 0:
+                return self._grid
+            self._grid = await fetch_grid(self.client, lat, lon, self.step)
+        except Exception as e:
+            # mantém a grade anterior; tenta de novo no próximo ciclo
+            print(f"⚠️ Falha ao atualizar grade de dryness: {e}")
+        return self._grid
+
+    async def run(self, points: Callable[[], Tuple[np.ndarray, np.ndarray]], lazy: bool = True) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wanted = asyncio.Event()
+        if lazy:
+            await self._wanted.wait()
+        while True:
+            await self.refresh(points)
+            await asyncio.sleep(self.interval)
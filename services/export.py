@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+"""
+Exportação em streaming do cubo de risco (CSV / NDJSON, gzip opcional).
+
+Os geradores produzem um bloco por (cidade, data): memória constante
+independentemente do tamanho do intervalo exportado.
+"""
+
+import csv
+import io
+import json
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple
+
+from services.risk_engine import RiskCube
+
+
+def iter_csv(parts: Iterable[Tuple[Optional[str], RiskCube, Iterable[int]]]) -> Iterator[bytes]:
+    """
+    `parts`: (cidade, cubo, índices de data). Com cidade != None a primeira coluna é `city`.
+    Formato igual ao DataFrame.to_csv(index=False) dos mesmos registros.
+    """
+    header_done = False
+    for city, cube, dates in parts:
+        for d in dates:
+            buf = io.StringIO()
+            w = csv.writer(buf, lineterminator="\n")
+            rows = cube.records(d)
+            if not header_done and rows:
+                w.writerow((["city"] if city else []) + list(rows[0].keys()))
+                header_done = True
+            for r in rows:
+                w.writerow(([city] if city else []) + ["" if v is None else v for v in r.values()])
+            yield buf.getvalue().encode("utf-8")
+
+
+def iter_ndjson(parts: Iterable[Tuple[Optional[str], RiskCube, Iterable[int]]]) -> Iterator[bytes]:
+    for city, cube, dates in parts:
+        for d in dates:
+            lines: List[str] = []
+            for r in cube.records(d):
+                if city: r = {"city": city, **r}
+                lines.append(json.dumps(r, ensure_ascii=False))
+            yield ("\n".join(lines) + "\n").encode("utf-8") if lines else b""
+
+
+def gzip_stream(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 -> cabeçalho gzip
+    for c in chunks:
+        out = z.compress(c)
+        if out:
+            yield out
+    yield z.flush()
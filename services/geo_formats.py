@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+Formatos alternativos de saída para o risco por bairro.
+
+- TopoJSON: bordas compartilhadas entre bairros vizinhos viram um único arco
+  (coordenadas quantizadas + delta encoding).
+- FlatGeobuf (via pyogrio) e Arrow IPC / GeoArrow (geometria WKB, via pyarrow):
+  binários colunares, sem parse de texto no cliente.
+
+Todos são gerados a partir das mesmas geometrias/propriedades do snapshot em memória.
+"""
+
+import io
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+try:
+    import pyarrow as pa
+    PYARROW_OK = True
+except Exception:
+    PYARROW_OK = False
+
+try:
+    import pyogrio
+    PYOGRIO_OK = True
+except Exception:
+    PYOGRIO_OK = False
+
+MEDIA_TYPES = {
+    "geojson": "application/json",
+    "topojson": "application/json",
+    "fgb": "application/flatgeobuf",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "csv": "text/csv; charset=utf-8",
+}
+
+# ------------------------------ TopoJSON ------------------------------
+
+Point = Tuple[int, int]
+
+
+@dataclass(frozen=True)
+class Topology:
+    transform: Dict[str, List[float]]
+    arcs: List[List[List[int]]]          # delta-encoded
+    geometries: List[Dict[str, Any]]     # {"type", "arcs"} por feição, sem propriedades
+
+
+def _rings(geom) -> List[List[np.ndarray]]:
+    """Lista de polígonos, cada um como lista de anéis (exterior + buracos)."""
+    if geom is None or geom.is_empty:
+        return []
+    polys = geom.geoms if geom.geom_type == "MultiPolygon" else [geom]
+    return [[np.asarray(p.exterior.coords)] + [np.asarray(r.coords) for r in p.interiors] for p in polys]
+
+
+def build_topology(geoms, quantization: int = 100_000) -> Topology:
+    geoms = list(geoms)
+    x0, y0, x1, y1 = shapely.total_bounds(np.asarray(geoms, dtype=object))
+    kx = (x1 - x0) / (quantization - 1) or 1.0
+    ky = (y1 - y0) / (quantization - 1) or 1.0
+
+    # 1) quantiza os anéis (sem o ponto de fechamento e sem vértices repetidos)
+    shapes: List[List[List[List[Point]]]] = []
+    for g in geoms:
+        polys = []
+        for rings in _rings(g):
+            qrings = []
+            for r in rings:
+                q = np.round((r - [x0, y0]) / [kx, ky]).astype(np.int64)
+                keep = np.ones(len(q), dtype=bool)
+                keep[1:] = np.any(q[1:] != q[:-1], axis=1)
+                pts = [tuple(p) for p in q[keep].tolist()]
+                if len(pts) > 1 and pts[0] == pts[-1]:
+                    pts = pts[:-1]
+                qrings.append(pts)
+            polys.append(qrings)
+        shapes.append(polys)
+
+    # 2) junções: pontos visitados com vizinhanças diferentes (início/fim de borda compartilhada)
+    neighbours: Dict[Point, set] = {}
+    for polys in shapes:
+        for rings in polys:
+            for pts in rings:
+                n = len(pts)
+                for i, p in enumerate(pts):
+                    a, b = pts[i - 1], pts[(i + 1) % n]
+                    neighbours.setdefault(p, set()).add((a, b) if a <= b else (b, a))
+    junctions = {p for p, s in neighbours.items() if len(s) > 1}
+
+    # 3) corta cada anel nas junções e deduplica arcos (sentido inverso -> índice ~i)
+    arc_index: Dict[Tuple[Point, ...], int] = {}
+    arcs: List[List[Point]] = []
+
+    def arc_id(seq: List[Point]) -> int:
+        key = tuple(seq)
+        if key in arc_index: return arc_index[key]
+        rev = key[::-1]
+        if rev in arc_index: return ~arc_index[rev]
+        arc_index[key] = len(arcs); arcs.append(seq)
+        return arc_index[key]
+
+    def ring_arcs(pts: List[Point]) -> List[int]:
+        if not pts:
+            return []
+        cuts = [i for i, p in enumerate(pts) if p in junctions]
+        if not cuts:
+            # anel isolado (ou idêntico a outro anel inteiro): rotação canônica
+            k = pts.index(min(pts))
+            rot = pts[k:] + pts[:k]
+            return [arc_id(rot + [rot[0]])]
+        k = cuts[0]
+        rot = pts[k:] + pts[:k] + [pts[k]]
+        out, start = [], 0
+        for i in range(1, len(rot)):
+            if rot[i] in junctions or i == len(rot) - 1:
+                out.append(arc_id(rot[start:i + 1])); start = i
+        return out
+
+    geometries = []
+    for polys in shapes:
+        if not polys:
+            geometries.append({"type": None}); continue
+        parts = [[ring_arcs(r) for r in rings] for rings in polys]
+        if len(parts) == 1:
+            geometries.append({"type": "Polygon", "arcs": parts[0]})
+        else:
+            geometries.append({"type": "MultiPolygon", "arcs": parts})
+
+    encoded = []
+    for a in arcs:
+        q = np.asarray(a, dtype=np.int64)
+        q[1:] = np.diff(q, axis=0)
+        encoded.append(q.tolist())
+    return Topology(transform={"scale": [kx, ky], "translate": [x0, y0]}, arcs=encoded, geometries=geometries)
+
+
+def topojson_dict(topo: Topology, props: List[Dict[str, Any]], object_name: str = "bairros") -> Dict[str, Any]:
+    geoms = []
+    for i, (g, p) in enumerate(zip(topo.geometries, props)):
+        geoms.append({**g, "id": str(i), "properties": p})
+    return {
+        "type": "Topology",
+        "transform": topo.transform,
+        "objects": {object_name: {"type": "GeometryCollection", "geometries": geoms}},
+        "arcs": topo.arcs,
+    }
+
+# ------------------------------ Binários ------------------------------
+
+def to_geodataframe(props: List[Dict[str, Any]], geoms) -> gpd.GeoDataFrame:
+    return gpd.GeoDataFrame(pd.DataFrame(props), geometry=list(geoms), crs="EPSG:4326")
+
+
+def flatgeobuf_bytes(gdf: gpd.GeoDataFrame) -> bytes:
+    buf = io.BytesIO()
+    pyogrio.write_dataframe(gdf, buf, driver="FlatGeobuf", layer="bairros")
+    return buf.getvalue()
+
+
+def arrow_ipc_bytes(table) -> bytes:
+    """Arrow IPC (stream). Aceita DataFrame, GeoDataFrame (-> geoarrow.wkb) ou pa.Table."""
+    if isinstance(table, gpd.GeoDataFrame):
+        table = pa.table(table.to_arrow(geometry_encoding="WKB"))
+    elif isinstance(table, pd.DataFrame):
+        table = pa.Table.from_pandas(table, preserve_index=False)
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
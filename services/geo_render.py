@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+Renderização do GeoJSON de risco (/v1/geo/canoas/bairros_risk) sem re-serializar geometria.
+
+- A geometria de cada bairro é codificada em bytes JSON uma única vez por snapshot.
+- Por requisição só as propriedades (data, include) são serializadas e "costuradas"
+  entre os fragmentos de geometria.
+- Níveis de detalhe (simplificação que preserva topologia) são calculados no load do
+  snapshot; o arredondamento de coordenadas (precision=) é memoizado por nível.
+- BytesLRU guarda respostas completas (bytes + ETag) por (data, include, detalhe, versão).
+"""
+
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import shapely
+from shapely.geometry import mapping
+
+from services.risk_engine import RiskCube, HAZARD_FACTORS, U_SUBINDICES, INFRA_METRICS, level_names, json_float
+from services.geo_formats import (
+    Topology, build_topology, topojson_dict, to_geodataframe, flatgeobuf_bytes, arrow_ipc_bytes,
+)
+from services.tiles import TileIndex, detail_for_zoom, encode_tile
+
+BASE_PROPS = ["bairro", "U", "U_valid", "Risk_score", "Risk_level"]
+
+# tolerância de simplificação em graus (EPSG:4326): ~11 m e ~55 m em Canoas
+DETAIL_LEVELS = {"full": 0.0, "medium": 0.0001, "low": 0.0005}
+
+
+def dumps(obj: Any) -> bytes:
+    """JSON compacto, igual ao que o FastAPI produziria."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+
+class BytesLRU:
+    """LRU thread-safe e limitado de respostas já renderizadas: chave -> (bytes, etag)."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key) -> Optional[Tuple[bytes, str]]:
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+            return hit
+
+    def put(self, key, body: bytes) -> Tuple[bytes, str]:
+        item = (body, etag_for(body))
+        with self._lock:
+            self._data[key] = item
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return item
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+
+def normalize_include(include: Optional[str]) -> str:
+    # qualquer valor fora de basic|infra|hazard cai em "all" (comportamento original)
+    return include if include in ("basic", "infra", "hazard") else "all"
+
+
+def simplify_levels(geoms: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Geometrias por nível de detalhe. Usa coverage_simplify (bordas compartilhadas
+    simplificadas de forma idêntica nos dois bairros) quando o GEOS suporta;
+    senão simplify(preserve_topology=True) por polígono.
+    """
+    out = {}
+    for level, tol in DETAIL_LEVELS.items():
+        if tol == 0:
+            out[level] = geoms
+            continue
+        try:
+            out[level] = shapely.coverage_simplify(geoms, tol)
+        except Exception:
+            out[level] = shapely.simplify(geoms, tol, preserve_topology=True)
+    return out
+
+
+def quantize(geoms: np.ndarray, precision: Optional[int]) -> np.ndarray:
+    """Arredonda coordenadas para `precision` casas decimais e remove vértices repetidos."""
+    if precision is None:
+        return geoms
+    rounded = shapely.transform(geoms, lambda xy: np.round(xy, precision))
+    return shapely.remove_repeated_points(rounded)
+
+
+@dataclass(frozen=True)
+class GeoFeatures:
+    bairros: List[str]                  # na ordem do GeoJSON
+    cube_idx: np.ndarray                # posição do bairro no cubo (-1 se sem dados de U)
+    shapes: Dict[str, np.ndarray]       # nível de detalhe -> geometrias (shapely)
+    _memo: Dict[Tuple[str, str, Optional[int]], Any] = field(default_factory=dict, repr=False)
+    _lock: Any = field(default_factory=threading.Lock, repr=False)
+
+    def _cached(self, key, build):
+        val = self._memo.get(key)
+        if val is None:
+            with self._lock:
+                val = self._memo.get(key)
+                if val is None:
+                    val = self._memo[key] = build()
+        return val
+
+    def geometry(self, detail: str = "full", precision: Optional[int] = None) -> List[bytes]:
+        """Geometrias já serializadas para (detalhe, precisão), codificadas uma única vez."""
+        return self._cached(("geojson", detail, precision), lambda: [
+            dumps(mapping(g)) if g is not None else b"null" for g in quantize(self.shapes[detail], precision)
+        ])
+
+    def topology(self, detail: str = "full", precision: Optional[int] = None) -> Topology:
+        """Arcos TopoJSON (independem da data), montados uma única vez por (detalhe, precisão)."""
+        return self._cached(("topojson", detail, precision),
+                            lambda: build_topology(quantize(self.shapes[detail], precision)))
+
+    def props(self, cube: RiskCube, include: str) -> List[str]:
+        infra = [c for c in U_SUBINDICES + INFRA_METRICS if c in cube.static]
+        hazard = [c for c in HAZARD_FACTORS if c in cube.factors]
+        if include == "basic": return BASE_PROPS
+        if include == "infra": return BASE_PROPS + infra
+        if include == "hazard": return BASE_PROPS + hazard
+        return BASE_PROPS + infra + hazard
+
+    def tile_index(self, detail: str) -> TileIndex:
+        return self._cached(("tiles", detail, None), lambda: TileIndex(self.shapes[detail]))
+
+    def render_tile(self, cube: RiskCube, d: int, z: int, x: int, y: int) -> bytes:
+        """MVT do tile z/x/y com as propriedades básicas de risco da data d."""
+        index = self.tile_index(detail_for_zoom(z))
+        return encode_tile(index, z, x, y, self.feature_props(cube, d, "basic"))
+
+    def feature_props(self, cube: RiskCube, d: int, include: str) -> List[Dict[str, Any]]:
+        """Propriedades JSON-safe de cada feição (ordem do GeoJSON) para a data d."""
+        names = self.props(cube, include)
+        date_iso = cube.dates[d]
+        levels = level_names(cube.level[d])
+        cols: Dict[str, Any] = {
+            "U": cube.U, "U_valid": cube.valid, "Risk_score": cube.score[d], "Risk_level": levels,
+            **cube.static,
+        }
+        out = []
+        for name, b in zip(self.bairros, self.cube_idx):
+            props: Dict[str, Any] = {"bairro": name}
+            for k in names[1:]:
+                if b < 0:
+                    props[k] = None
+                elif k in cube.factors:
+                    props[k] = json_float(cube.factors[k][d, b])
+                elif k == "U_valid":
+                    props[k] = bool(cols[k][b])
+                elif k == "Risk_level":
+                    props[k] = cols[k][b]
+                else:
+                    props[k] = json_float(cols[k][b])
+            props["date"] = date_iso
+            out.append(props)
+        return out
+
+    def render(self, cube: RiskCube, d: int, include: str,
+               detail: str = "full", precision: Optional[int] = None) -> bytes:
+        parts = [b'{"type":"FeatureCollection","features":[']
+        rows = zip(self.feature_props(cube, d, include), self.geometry(detail, precision))
+        for i, (props, geom) in enumerate(rows):
+            if i: parts.append(b",")
+            parts += [b'{"id":"', str(i).encode(), b'","type":"Feature","properties":', dumps(props),
+                      b',"geometry":', geom, b"}"]
+        parts.append(b"]}")
+        return b"".join(parts)
+
+    def render_as(self, fmt: str, cube: RiskCube, d: int, include: str,
+                  detail: str = "full", precision: Optional[int] = None) -> bytes:
+        """geojson | topojson | fgb (FlatGeobuf) | arrow (Arrow IPC com geometria geoarrow.wkb)."""
+        if fmt == "geojson":
+            return self.render(cube, d, include, detail, precision)
+        props = self.feature_props(cube, d, include)
+        if fmt == "topojson":
+            return dumps(topojson_dict(self.topology(detail, precision), props))
+        gdf = to_geodataframe(props, quantize(self.shapes[detail], precision))
+        if fmt == "fgb":
+            return flatgeobuf_bytes(gdf)
+        if fmt == "arrow":
+            return arrow_ipc_bytes(gdf)
+        raise ValueError(f"formato desconhecido: {fmt}")
+
+
+def build_geo_features(gdf: gpd.GeoDataFrame, cube: RiskCube,
+                       shapes: Optional[Dict[str, np.ndarray]] = None) -> GeoFeatures:
+    """`shapes`: níveis de detalhe já simplificados (ex.: snapshot compartilhado)."""
+    bairros = gdf["bairro"].astype(str).tolist()
+    idx = np.array([cube.bairro_pos.get(b, -1) for b in bairros], dtype=np.int64)
+    if shapes is None:
+        shapes = simplify_levels(gdf.geometry.values.to_numpy())
+    feats = GeoFeatures(bairros=bairros, cube_idx=idx, shapes=shapes)
+    for level in DETAIL_LEVELS:
+        feats.geometry(level)
+    return feats
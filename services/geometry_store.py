@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+Geometrias dos bairros em WGS84 e em CRS métrico (EPSG:31982), calculadas uma vez.
+
+- Transformers pyproj são criados uma única vez por par de CRS (cache do processo).
+- GeometryStore guarda, por bairro: polígono WGS84 e métrico, área (km²),
+  centróide (lat/lon e x/y) e bounds nos dois CRS.
+- Persistido ao lado de canoas_bairros_u.geojson (`canoas_bairros_u.geom.npz`):
+  WKB + arrays numéricos, sem pickle. É reconstruído quando o GeoJSON é mais novo.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import shapely
+from pyproj import Transformer
+
+WGS84 = "EPSG:4326"
+METRIC_CRS = "EPSG:31982"   # SIRGAS 2000 / UTM 22S (Canoas/RS)
+FALLBACK_CRS = "EPSG:3857"
+
+
+@lru_cache(maxsize=None)
+def transformer(src: str, dst: str) -> Transformer:
+    return Transformer.from_crs(src, dst, always_xy=True)
+
+
+def metric_transformers() -> Tuple[Transformer, Transformer, str]:
+    """(WGS84 -> métrico, métrico -> WGS84, CRS); UTM 22S com fallback WebMercator."""
+    try:
+        return transformer(WGS84, METRIC_CRS), transformer(METRIC_CRS, WGS84), METRIC_CRS
+    except Exception:
+        return transformer(WGS84, FALLBACK_CRS), transformer(FALLBACK_CRS, WGS84), FALLBACK_CRS
+
+
+def project(geoms: np.ndarray, to_xy: Transformer) -> np.ndarray:
+    """Reprojeta um array de geometrias com uma única chamada pyproj para todos os vértices."""
+    return shapely.transform(geoms, lambda xy: np.column_stack(to_xy.transform(xy[:, 0], xy[:, 1])))
+
+
+def store_path(geojson: Path) -> Path:
+    """x.geojson / x.geo.parquet -> x.geom.npz"""
+    return Path(geojson).with_name(Path(geojson).name.split(".")[0] + ".geom.npz")
+
+
+@dataclass(frozen=True)
+class GeometryStore:
+    bairros: List[str]
+    pos: Dict[str, int]
+    crs: str                        # CRS métrico de `xy`
+    wgs: np.ndarray                 # (B,) polígonos EPSG:4326
+    xy: np.ndarray                  # (B,) polígonos no CRS métrico
+    area_km2: np.ndarray            # (B,)
+    lat: np.ndarray                 # (B,) centróide WGS84
+    lon: np.ndarray
+    centroid_xy: np.ndarray         # (B, 2) centróide no CRS métrico
+    bounds: np.ndarray              # (B, 4) minx, miny, maxx, maxy (lon/lat)
+    bounds_xy: np.ndarray           # (B, 4) no CRS métrico
+
+    def index(self, bairro: str) -> Optional[int]:
+        return self.pos.get(str(bairro))
+
+    def centroid(self, bairro: str) -> Optional[Tuple[float, float]]:
+        """(lat, lon) do centróide; None se o bairro não existe."""
+        b = self.index(bairro)
+        return None if b is None else (float(self.lat[b]), float(self.lon[b]))
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        wkb = lambda g: [shapely.to_wkb(x) for x in g]
+        flat = lambda parts: (np.frombuffer(b"".join(parts), dtype=np.uint8),
+                              np.cumsum([0] + [len(p) for p in parts], dtype=np.int64))
+        wgs, wgs_off = flat(wkb(self.wgs)); xy, xy_off = flat(wkb(self.xy))
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, bairros=np.array(self.bairros, dtype=str), crs=np.array(self.crs),
+                     wgs=wgs, wgs_off=wgs_off, xy=xy, xy_off=xy_off, area_km2=self.area_km2,
+                     lat=self.lat, lon=self.lon, centroid_xy=self.centroid_xy,
+                     bounds=self.bounds, bounds_xy=self.bounds_xy)
+        os.replace(tmp, path)
+
+
+def build_geometry_store(bairros: List[str], geoms_wgs) -> GeometryStore:
+    wgs = np.asarray(list(geoms_wgs), dtype=object)
+    to_xy, _, crs = metric_transformers()
+    xy = project(wgs, to_xy)
+    c = shapely.centroid(wgs); cxy = shapely.centroid(xy)
+    bairros = [str(b) for b in bairros]
+    return GeometryStore(
+        bairros=bairros, pos={b: i for i, b in enumerate(bairros)}, crs=crs, wgs=wgs, xy=xy,
+        area_km2=shapely.area(xy) / 1e6, lat=shapely.get_y(c), lon=shapely.get_x(c),
+        centroid_xy=np.column_stack([shapely.get_x(cxy), shapely.get_y(cxy)]),
+        bounds=shapely.bounds(wgs), bounds_xy=shapely.bounds(xy),
+    )
+
+
+def load_geometry_store(path: Path) -> GeometryStore:
+    with np.load(path, allow_pickle=False) as z:
+        unflat = lambda buf, off: shapely.from_wkb([buf[off[i]:off[i + 1]].tobytes() for i in range(len(off) - 1)])
+        bairros = z["bairros"].tolist()
+        return GeometryStore(
+            bairros=bairros, pos={b: i for i, b in enumerate(bairros)}, crs=str(z["crs"]),
+            wgs=unflat(z["wgs"], z["wgs_off"]), xy=unflat(z["xy"], z["xy_off"]),
+            area_km2=z["area_km2"], lat=z["lat"], lon=z["lon"], centroid_xy=z["centroid_xy"],
+            bounds=z["bounds"], bounds_xy=z["bounds_xy"],
+        )
+
+
+def geometry_store_for(geojson: Path, bairros: List[str], geoms_wgs) -> GeometryStore:
+    """
+    Store persistido se estiver atualizado (mais novo que o GeoJSON e com os mesmos bairros);
+    senão reconstrói a partir das geometrias dadas e tenta gravá-lo de novo.
+    """
+    path = store_path(geojson)
+    try:
+        if path.stat().st_mtime_ns >= Path(geojson).stat().st_mtime_ns:
+            store = load_geometry_store(path)
+            if store.bairros == [str(b) for b in bairros]:
+                return store
+    except (OSError, ValueError, KeyError):
+        pass
+    store = build_geometry_store(bairros, geoms_wgs)
+    try:
+        store.save(path)
+    except OSError as e:
+        print(f"⚠️ Não foi possível gravar {path.name}: {e}")
+    return store
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+Cache persistente (SQLite) de insights do LLM, endereçado por conteúdo.
+
+- Chave = hash da requisição ao modelo (modelo + mensagens: idioma, schema, RAG e
+  contexto JSON). Contexto idêntico => mesma resposta, sem nova chamada.
+- TTL por entrada e limite de tamanho (evicção LRU por último acesso).
+- Deduplicação em voo: chamadas concorrentes com a mesma chave esperam a mesma
+  chamada ao LLM em vez de abrir uma cada.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+
+def insight_key(model: str, messages: list, **params) -> str:
+    body = {"model": model, "messages": messages, **params}
+    raw = json.dumps(body, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class InsightCache:
+
+    def __init__(self, path: Path, ttl: float = 21600.0, max_entries: int = 2000):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    def _conn(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""CREATE TABLE IF NOT EXISTS insights (
+                key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)""")
+            db.execute("CREATE INDEX IF NOT EXISTS insights_accessed ON insights(accessed)")
+            self._db = db
+        return self._db
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            row = db.execute("SELECT value, created FROM insights WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl:
+                db.execute("DELETE FROM insights WHERE key=?", (key,))
+                return None
+            db.execute("UPDATE insights SET accessed=? WHERE key=?", (now, key))
+        return json.loads(row[0])
+
+    def put(self, key: str, value: Dict[str, Any]) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("INSERT OR REPLACE INTO insights VALUES (?,?,?,?)",
+                       (key, json.dumps(value, ensure_ascii=False), now, now))
+            db.execute("DELETE FROM insights WHERE created < ?", (now - self.ttl,))
+            db.execute("""DELETE FROM insights WHERE key IN (
+                SELECT key FROM insights ORDER BY accessed DESC LIMIT -1 OFFSET ?)""", (self.max_entries,))
+
+    def get_or_compute(self, key: str, compute: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+        """
+        Valor em cache ou `compute()`; só uma execução por chave em andamento.
+        Resultado None (ex.: resposta não-JSON do modelo) é devolvido mas não gravado.
+        """
+        hit = self.get(key)
+        if hit is not None:
+            return hit
+        with self._lock:
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = self._inflight[key] = Future()
+        if not owner:
+            return fut.result()
+        try:
+            # outro dono pode ter gravado e saído entre o get() acima e o registro em _inflight
+            value = self.get(key)
+            if value is not None:
+                fut.set_result(value)
+                return value
+            value = compute()
+            if value is not None:
+                self.put(key, value)
+            fut.set_result(value)
+            return value
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn().execute("DELETE FROM insights")
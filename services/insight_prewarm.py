@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Pré-geração de insights do LLM após cada troca de snapshot.
+
+- Quando a versão do snapshot muda (publicação do hazard ou mtime dos arquivos),
+  gera em lote os insights dos bairros amarelos/vermelhos e a síntese city_top
+  de cada data do horizonte; os resultados vão para o InsightCache e os endpoints
+  passam a responder sem esperar o LLM.
+- Concorrência limitada (semáforo + threads), poucas tentativas com backoff.
+- Os jobs vêm de um callable da API (mesmas mensagens dos endpoints => mesma chave
+  de cache); aqui só há a orquestração.
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, List, Optional, Tuple
+
+INSIGHT_PREWARM = os.getenv("INSIGHT_PREWARM", "0") == "1"
+INSIGHT_PREWARM_CONCURRENCY = int(os.getenv("INSIGHT_PREWARM_CONCURRENCY", "4"))
+INSIGHT_PREWARM_POLL_SECONDS = float(os.getenv("INSIGHT_PREWARM_POLL_SECONDS", "30"))
+
+Job = Tuple[str, Callable[[], Any]]
+
+
+class InsightPrewarmer:
+
+    def __init__(self, get_snapshot: Callable[[], Any], jobs: Callable[[Any], List[Job]],
+                 concurrency: int = INSIGHT_PREWARM_CONCURRENCY, retries: int = 2, backoff: float = 1.0,
+                 poll: float = INSIGHT_PREWARM_POLL_SECONDS):
+        self.get_snapshot = get_snapshot
+        self.jobs = jobs
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.poll = poll
+        self.last_version: Optional[int] = None
+        self.last_stats: Optional[dict] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def notify(self) -> None:
+        """Acorda o laço (ex.: após publicar o hazard); pode ser chamado de qualquer thread."""
+        if self._loop is not None and self._wake is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def _run_job(self, sem: asyncio.Semaphore, label: str, fn: Callable[[], Any]) -> bool:
+        async with sem:
+            for attempt in range(self.retries + 1):
+                try:
+                    if await asyncio.to_thread(fn) is not None:
+                        return True
+                    err = "resposta inválida"
+                except Exception as e:
+                    err = str(e)
+                if attempt < self.retries:
+                    await asyncio.sleep(self.backoff * (2 ** attempt))
+            print(f"⚠️ Insight não pré-gerado ({label}): {err}")
+            return False
+
+    async def run_for(self, snap) -> dict:
+        t0 = time.time()
+        jobs = self.jobs(snap)
+        sem = asyncio.Semaphore(self.concurrency)
+        ok = await asyncio.gather(*(self._run_job(sem, label, fn) for label, fn in jobs))
+        self.last_version = snap.version
+        self.last_stats = {"version": snap.version, "jobs": len(jobs), "ok": int(sum(ok)),
+                           "failed": len(jobs) - int(sum(ok)), "seconds": round(time.time() - t0, 2)}
+        print(f"🧠 Insights pré-gerados v{snap.version}: {self.last_stats['ok']}/{len(jobs)} "
+              f"em {self.last_stats['seconds']}s")
+        return self.last_stats
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        while True:
+            try:
+                snap = await asyncio.to_thread(self.get_snapshot)   # get() também detecta mtime novo
+            except Exception:
+                snap = None
+            if snap is not None and snap.version != self.last_version:
+                await self.run_for(snap)
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""
+Insights do LLM em streaming (Server-Sent Events).
+
+Eventos, nesta ordem:
+- `meta`: cabeçalho da resposta (bairro/data/risco...), enviado antes de chamar o modelo;
+- `delta`: pedaços do JSON gerado ({"text": ...}), à medida que chegam;
+- `done`: payload final, igual ao do endpoint não-streaming (insight já parseado);
+- `error`: falha no meio do stream ({"detail": ...}).
+
+Com cache (InsightCache) a resposta vem inteira em `done`, sem `delta`; uma geração
+completa e válida é gravada com a mesma chave do endpoint não-streaming.
+"""
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+from services.insight_cache import InsightCache, insight_key
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse(event: str, data: Any) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode("utf-8")
+
+
+async def stream_insight(client, model: str, messages: list, cache: InsightCache,
+                         meta: Dict[str, Any], fallback: Dict[str, Any],
+                         finish: Callable[[Dict[str, Any]], Dict[str, Any]]) -> AsyncIterator[bytes]:
+    """
+    `client`: AsyncOpenAI compartilhado; `finish(insight)` monta o payload final de `done`.
+    """
+    yield sse("meta", meta)
+    key = insight_key(model, messages, temperature=0.2)
+    hit = await asyncio.to_thread(cache.get, key)
+    if hit is not None:
+        yield sse("done", finish(hit))
+        return
+    parts = []
+    try:
+        stream = await client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.2,
+            response_format={"type":"json_object"},
+            stream=True,
+        )
+        async for chunk in stream:
+            text = chunk.choices[0].delta.content if chunk.choices else None
+            if text:
+                parts.append(text)
+                yield sse("delta", {"text": text})
+    except Exception as e:
+        yield sse("error", {"detail": str(e)})
+        return
+    insight: Optional[Dict[str, Any]]
+    try:
+        insight = json.loads("".join(parts))
+    except Exception:
+        insight = None
+    if insight is not None:
+        await asyncio.to_thread(cache.put, key, insight)
+    yield sse("done", finish(insight if insight is not None else fallback))
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Cliente Open-Meteo assíncrono para o caminho de requisição da API.
+
+- Um único httpx.AsyncClient (pool de conexões) por processo.
+- Timeout por requisição e poucas tentativas com backoff exponencial.
+- Vários pontos numa única requisição multi-localização (`hourly_many`).
+"""
+
+import asyncio
+import os
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import httpx
+    HTTPX_OK = True
+except Exception:
+    HTTPX_OK = False
+
+FORECAST_URL = os.getenv("OPEN_METEO_FORECAST_URL", "https://api.open-meteo.com/v1/forecast")
+TZ = "America/Sao_Paulo"
+
+
+class AsyncOpenMeteo:
+
+    def __init__(self, base_url: str = FORECAST_URL, timeout: float = 10.0,
+                 retries: int = 2, backoff: float = 0.3, max_connections: int = 20):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self._client: Optional["httpx.AsyncClient"] = None
+
+    def _http(self) -> "httpx.AsyncClient":
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+            )
+        return self._client
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def _get_json(self, params: dict) -> dict:
+        for attempt in range(self.retries + 1):
+            try:
+                r = await self._http().get(self.base_url, params=params)
+                if r.status_code < 500:
+                    r.raise_for_status()
+                    return r.json()
+                err: Exception = RuntimeError(f"Open-Meteo HTTP {r.status_code}")
+            except httpx.TransportError as e:
+                err = e
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * (2 ** attempt))
+        raise err
+
+    async def hourly_many(self, lats: List[float], lons: List[float], variables: List[str],
+                          past_days: int = 2, forecast_days: int = 16) -> List[pd.DataFrame]:
+        """Séries horárias de vários pontos numa única requisição (latitude/longitude separadas por vírgula)."""
+        lats = [round(float(v), 4) for v in lats]; lons = [round(float(v), 4) for v in lons]
+        data = await self._get_json({
+            "latitude": ",".join(map(str, lats)), "longitude": ",".join(map(str, lons)),
+            "timezone": TZ, "timeformat": "unixtime",
+            "past_days": past_days, "forecast_days": forecast_days, "hourly": ",".join(variables),
+        })
+        # um ponto -> objeto; vários -> lista na mesma ordem
+        return [hourly_frame(d, variables) for d in (data if isinstance(data, list) else [data])]
+
+
+def hourly_frame(data: dict, variables: List[str]) -> pd.DataFrame:
+    h = data.get("hourly", {})
+    df = pd.DataFrame({"time": pd.to_datetime(h.get("time", []), unit="s", utc=True)})
+    for name in variables:
+        vals = h.get(name)
+        df[name] = np.asarray(vals, dtype=float) if vals is not None else np.nan
+    df["time_local"] = df["time"].dt.tz_convert(TZ)
+    df["date"] = df["time_local"].dt.date
+    return df
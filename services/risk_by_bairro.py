@@ -1,14 +1,20 @@
 # -*- coding: utf-8 -*-
 """
-Une H_score (cidade) + U_t (bairros) -> Risk_score por bairro/data.
+Une H_score (cidade, ou por bairro se houver hazard_by_bairro.csv) + U_t (bairros) -> Risk_score por bairro/data.
 """
 
-import pandas as pd
-import geopandas as gpd
 from pathlib import Path
 import os
 import yaml, json
 import sys
+import argparse
+
+try:
+    from services.risk_engine import classify_levels, level_names, compile_filters, FILTER_FIELDS, HAZARD_FACTORS
+    from services import storage
+except ImportError:  # executado como script: python services/risk_by_bairro.py
+    from risk_engine import classify_levels, level_names, compile_filters, FILTER_FIELDS, HAZARD_FACTORS
+    import storage
 
 CITY = "canoas"
 
@@ -17,6 +23,7 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]  # Altere conforme sua estrut
 SCRIPT_DIR = Path(__file__).parent.resolve()  # Diretório atual do script
 DATA = PROJECT_ROOT / "giovanni-algoritmo"
 HAZARD_CSV = DATA / "services" / "data" / "hazard" / "hazard_forecast.csv"
+HAZARD_BAIRRO_CSV = DATA / "services" / "data" / "hazard" / "hazard_by_bairro.csv"   # opcional
 U_CSV = DATA / "services" / "data" / "u" / "canoas_bairros_u.csv"
 U_GEOJSON = DATA / "services" / "data" / "u" / "canoas_bairros_u.geojson"
 OUT_DIR = DATA / "services" / "data" / "risk"
@@ -24,10 +31,22 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 WEIGHTS_YAML = DATA / "configs" / "weights.yaml"
 
 
-def main():
+def parse_filters(argv=None) -> dict:
+    """Mesmos filtros da API (/v1/risk/by_bairro), aplicados ao CSV exportado."""
+    ap = argparse.ArgumentParser(description=__doc__)
+    ap.add_argument("--risk-level", dest="risk_level", help="ex.: red,yellow")
+    for key in FILTER_FIELDS:
+        ap.add_argument(f"--min-{key.replace('_', '-')}", dest=f"min_{key}", type=float)
+        ap.add_argument(f"--max-{key.replace('_', '-')}", dest=f"max_{key}", type=float)
+    return vars(ap.parse_args(argv))
+
+
+def main(params: dict | None = None):
+    flt = compile_filters(params or {})
+
     # Ensure all required files exist
     for file in [HAZARD_CSV, U_CSV, U_GEOJSON, WEIGHTS_YAML]:
-        if not file.exists():
+        if not (storage.exists(file) if file.suffix in (".csv", ".geojson") else file.exists()):
             sys.exit(f"❌ Required file not found: {file}")
 
     # Load weights and thresholds
@@ -36,17 +55,19 @@ def main():
 
     # 1) Read H_score (cidade)
     try:
-        dfH = pd.read_csv(HAZARD_CSV, parse_dates=["date"])
+        dfH = storage.read_table(HAZARD_CSV, dates=["date"])
     except Exception as e:
         sys.exit(f"❌ Failed to read HAZARD_CSV ({HAZARD_CSV}): {e}")
     if "H_score" not in dfH.columns:
         sys.exit("❌ Column 'H_score' missing in hazard_forecast.csv")
-    dfH = dfH[["date", "H_score"]]
+    # fatores de perigo ficam para os filtros --min-/--max-<fator> (mesmas colunas da API)
+    factors = [c for c in HAZARD_FACTORS if c in dfH.columns]
+    dfH = dfH[["date", "H_score", *factors]]
 
     # 2) Read U data by bairro
     try:
-        dfU = pd.read_csv(U_CSV)
-        gdfU = gpd.read_file(U_GEOJSON)
+        dfU = storage.read_table(U_CSV)
+        gdfU = storage.read_geo(U_GEOJSON)
     except Exception as e:
         sys.exit(f"❌ Failed to read U_CSV or U_GEOJSON: {e}")
     if "U_t" not in dfU.columns:
@@ -56,25 +77,34 @@ def main():
     # 3) Cross-join (assign same H_score to all bairros by date)
     dfH["key"] = 1
     dfU["key"] = 1
-    dfR = dfH.merge(dfU, on="key", suffixes=("_hazard", "_infra"))
+    dfR = dfH.merge(dfU, on="key", suffixes=("", "_infra"))   # sm_norm do hazard (o de U vira sm_norm_infra)
     dfR.drop(columns="key", inplace=True)
 
+    # 3b) H por bairro (hazard multi-localização), onde existir
+    if storage.exists(HAZARD_BAIRRO_CSV):
+        dfHB = storage.read_table(HAZARD_BAIRRO_CSV, dates=["date"])
+        local = ["H_score", *[c for c in factors if c in dfHB.columns]]
+        dfHB = dfHB[["date", "bairro", *local]]
+        dfHB["bairro"] = dfHB["bairro"].astype(str)
+        dfR["bairro"] = dfR["bairro"].astype(str)
+        dfR = dfR.merge(dfHB.rename(columns={c: f"{c}_bairro" for c in local}), on=["date", "bairro"], how="left")
+        for c in local:
+            dfR[c] = dfR[f"{c}_bairro"].fillna(dfR[c])
+        dfR.drop(columns=[f"{c}_bairro" for c in local], inplace=True)
+
     # 4) Calculate Risk
     dfR["Risk_score"] = (dfR["H_score"] * dfR["Fragilidade_t"]).clip(0, 1)
 
-    def bucket(x):
-        if x < green: return "green"
-        if x < yellow: return "yellow"
-        return "red"
-
-    dfR["Risk_level"] = dfR["Risk_score"].apply(bucket)
+    codes = classify_levels(dfR["Risk_score"].to_numpy(), {"green_max": green, "yellow_max": yellow})
+    dfR["Risk_level"] = level_names(codes)
 
-    # 5) Aggregate and export (CSV and GeoJSON)
+    # 5) Aggregate and export (Parquet/GeoParquet, or CSV/GeoJSON per DATA_FORMAT)
     out_csv = OUT_DIR / f"{CITY}_bairros_risk.csv"
     dfR_out = dfR[[
         "bairro", "date", "H_score", "U_t", "Fragilidade_t", "Risk_score", "Risk_level"
     ]]
-    dfR_out.to_csv(out_csv, index=False)
+    dfR_out = dfR_out[flt.mask(codes, {c: dfR[c].to_numpy() for c in dfR.columns})]
+    out_csv = storage.write_table(dfR_out, out_csv)
 
     # GeoJSON -> export last day's data
     last_date = dfR["date"].max()
@@ -83,12 +113,12 @@ def main():
         on="bairro",
         how="left"
     )
-    gdf_last.to_file(OUT_DIR / f"{CITY}_bairros_risk.geojson", driver="GeoJSON")
+    out_geo = storage.write_geo(gdf_last, OUT_DIR / f"{CITY}_bairros_risk.geojson")
 
     print(f"✅ Risk generated: {len(dfR_out)} rows, {len(gdf_last)} bairros.")
-    print(f"- CSV: {out_csv}")
-    print(f"- GeoJSON: {OUT_DIR / f'{CITY}_bairros_risk.geojson'}")
+    print(f"- Table: {out_csv}")
+    print(f"- Geometry: {out_geo}")
 
 
 if __name__ == "__main__":
-    main()
+    main(parse_filters())
@@ -0,0 +1,263 @@
+# -*- coding: utf-8 -*-
+"""
+Cubo de risco pré-calculado (data × bairro) em arrays NumPy.
+
+Montado uma vez por snapshot de dados: Risk = H(data, bairro) * (1 - U(bairro)),
+com U==0/NaN tratado como "no_data". H vem de hazard_by_bairro.csv quando existe
+(hazard por célula/bairro); senão o H da cidade é replicado para todos os bairros. Os endpoints respondem por índice
+(data, bairro) em vez de recalcular merges/cópias em pandas a cada chamada.
+
+Também concentra a classificação vetorizada (green/yellow/red) e o motor de
+filtros min_*/max_*/risk_level, usados pela API e por risk_by_bairro.py.
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+HAZARD_FACTORS = ["p6_pct", "a72_pct", "sm_norm", "et_deficit", "p1_pct", "pp_unit", "rd_norm"]
+U_SUBINDICES = ["u_cobertura", "u_micro", "u_macro", "u_permeabilidade"]
+INFRA_METRICS = ["dens_pav_km_km2", "dreno_km_km2", "canal_km_km2", "frac_verde", "pumps_n", "area_km2"]
+
+TOP_MAX = 50   # maior n aceito por /v1/risk/by_bairro/top
+
+LEVELS = ["green", "yellow", "red", "no_data"]
+NO_DATA = LEVELS.index("no_data")
+
+
+def bucket_risk(x: float, thresholds: Dict[str, float]) -> str:
+    if pd.isna(x): return "no_data"
+    g = thresholds["green_max"]; y = thresholds["yellow_max"]
+    if x < g: return "green"
+    if x < y: return "yellow"
+    return "red"
+
+
+def classify_levels(scores, thresholds: Dict[str, float]) -> np.ndarray:
+    """Versão vetorizada de bucket_risk: códigos int8 em LEVELS (NaN -> no_data)."""
+    s = np.asarray(scores, dtype=float)
+    edges = np.array([thresholds["green_max"], thresholds["yellow_max"]], dtype=float)
+    codes = np.digitize(s, edges).astype(np.int8)
+    codes[np.isnan(s)] = NO_DATA
+    return codes
+
+
+def level_names(codes) -> np.ndarray:
+    return np.asarray(LEVELS, dtype=object)[np.asarray(codes)]
+
+
+# ------------------------------ Filtros ------------------------------
+
+# nome do parâmetro (sem min_/max_) -> coluna filtrada
+FILTER_FIELDS = {"risk": "Risk_score", **{k: k for k in HAZARD_FACTORS + U_SUBINDICES}}
+
+
+@dataclass(frozen=True)
+class RiskFilter:
+    levels: Optional[np.ndarray]                                   # códigos permitidos (None = sem filtro)
+    ranges: Tuple[Tuple[str, Optional[float], Optional[float]], ...]
+
+    def mask(self, level: np.ndarray, cols: Mapping[str, Any]) -> np.ndarray:
+        """
+        Máscara combinada (um único AND) sobre arrays que fazem broadcast com `level`.
+        Colunas ausentes em `cols` são ignoradas; NaN nunca passa num range.
+        """
+        m = np.ones(np.shape(level), dtype=bool)
+        if self.levels is not None:
+            m &= np.isin(level, self.levels)
+        for col, lo, hi in self.ranges:
+            v = cols.get(col)
+            if v is None: continue
+            v = np.asarray(v, dtype=float)
+            if lo is not None: m &= v >= lo
+            if hi is not None: m &= v <= hi
+        return m
+
+
+def compile_filters(params: Mapping[str, Any]) -> RiskFilter:
+    """Compila risk_level ("red,yellow") e min_*/max_* em um RiskFilter."""
+    levels = None
+    raw = params.get("risk_level")
+    if raw:
+        allowed = {s.strip().lower() for s in str(raw).split(",")}
+        levels = np.array([i for i, name in enumerate(LEVELS) if name in allowed], dtype=np.int8)
+    ranges = []
+    for key, col in FILTER_FIELDS.items():
+        lo = params.get(f"min_{key}"); hi = params.get(f"max_{key}")
+        if lo is not None or hi is not None:
+            ranges.append((col, None if lo is None else float(lo), None if hi is None else float(hi)))
+    return RiskFilter(levels=levels, ranges=tuple(ranges))
+
+
+def json_float(x) -> Optional[float]:
+    """float JSON-safe (NaN/inf -> None)."""
+    x = float(x)
+    return x if np.isfinite(x) else None
+
+
+@dataclass(frozen=True)
+class RiskCube:
+    dates: List[str]                 # (D,) ISO, na ordem do hazard CSV
+    date_pos: Dict[str, int]
+    bairros: List[str]               # (B,) na ordem da tabela U
+    bairro_pos: Dict[str, int]
+    H: np.ndarray                    # (D, B)
+    H_city: np.ndarray               # (D,) H do ponto da cidade (hazard_forecast.csv)
+    local_hazard: bool               # True se H/fatores vieram por bairro
+    U: np.ndarray                    # (B,) U_t (ou U_static), NaN -> 0
+    U_static: np.ndarray             # (B,)
+    valid: np.ndarray                # (B,) bool, U > 0
+    score: np.ndarray                # (D, B) NaN onde no_data
+    level: np.ndarray                # (D, B) int8, índice em LEVELS
+    factors: Dict[str, np.ndarray]   # fator de perigo -> (D, B), só os presentes no hazard
+    static: Dict[str, np.ndarray]    # subíndices/métricas de infra -> (B,), só os presentes em U
+    rank: np.ndarray                 # (D, K) índices de bairro por score desc. (K <= TOP_MAX), -1 = vazio
+    rank_len: np.ndarray             # (D,) nº de posições válidas em rank[d]
+
+    def date_index(self, date_str: Optional[str]) -> int:
+        """Sem data -> primeira linha do hazard; data inexistente -> data mais recente."""
+        if date_str is None:
+            return 0
+        i = self.date_pos.get(pd.to_datetime(date_str).date().isoformat())
+        if i is None:
+            i = self.date_pos[max(self.dates)]
+        return i
+
+    def date_range(self, start: Optional[str] = None, end: Optional[str] = None) -> np.ndarray:
+        """Índices das datas em [start, end] (limites opcionais), na ordem do hazard."""
+        lo = pd.to_datetime(start).date().isoformat() if start else None
+        hi = pd.to_datetime(end).date().isoformat() if end else None
+        return np.array([i for i, d in enumerate(self.dates)
+                         if (lo is None or d >= lo) and (hi is None or d <= hi)], dtype=np.int64)
+
+    def bairro_index(self, bairro: str) -> Optional[int]:
+        return self.bairro_pos.get(str(bairro))
+
+    def columns(self, d: int) -> Dict[str, np.ndarray]:
+        """Colunas (B,) da data d, no layout de /v1/risk/by_bairro."""
+        B = len(self.bairros)
+        cols = {
+            "bairro": np.asarray(self.bairros, dtype=object),
+            "date": np.full(B, self.dates[d], dtype=object),
+            "H_score": self.H[d],
+            "U": self.U,
+            "U_valid": self.valid,
+            "Risk_score": self.score[d],
+            "Risk_level": level_names(self.level[d]),
+        }
+        for k in U_SUBINDICES:
+            if k in self.static: cols[k] = self.static[k]
+        for k, v in self.factors.items():
+            cols[k] = v[d]
+        return cols
+
+    def top(self, d: int, n: int) -> np.ndarray:
+        """Top-n da data d (só bairros com dados), fatia O(n) do ranking pré-calculado."""
+        if n > self.rank.shape[1] and self.rank_len[d] == self.rank.shape[1]:
+            s = self.score[d]
+            idx = np.flatnonzero(self.valid & ~np.isnan(s))
+            return idx[np.lexsort((idx, -s[idx]))][:n]
+        return self.rank[d, :min(n, int(self.rank_len[d]))]
+
+    def filter_mask(self, flt: RiskFilter, d: int) -> np.ndarray:
+        """Máscara (B,) dos bairros da data d que passam no filtro."""
+        cols = {"Risk_score": self.score[d], **self.static}
+        cols.update({k: v[d] for k, v in self.factors.items()})
+        return flt.mask(self.level[d], cols)
+
+    def records(self, d: int, idx=None) -> List[Dict[str, Any]]:
+        """Linhas JSON-safe da data d para os bairros `idx` (todos, se None), na ordem dada."""
+        cols = self.columns(d)
+        idx = range(len(self.bairros)) if idx is None else idx
+        out = []
+        for b in idx:
+            row = {}
+            for k, v in cols.items():
+                x = v[b]
+                if isinstance(x, (bool, np.bool_)): row[k] = bool(x)
+                elif isinstance(x, (float, np.floating)): row[k] = json_float(x)
+                else: row[k] = x
+            out.append(row)
+        return out
+
+
+def rank_orders(score: np.ndarray, valid: np.ndarray, k: int = TOP_MAX):
+    """
+    Para cada data, os k maiores scores (argpartition + ordenação só dos k),
+    empates pela ordem dos bairros. Retorna (rank (D, k) com -1 de preenchimento, rank_len (D,)).
+    """
+    D, B = score.shape
+    s = np.where(valid[None, :] & ~np.isnan(score), score, -np.inf)
+    k = min(k, B)
+    if k == 0:
+        return np.empty((D, 0), dtype=np.int64), np.zeros(D, dtype=np.int64)
+    part = np.argpartition(-s, k - 1, axis=1)[:, :k] if k < B else np.tile(np.arange(B), (D, 1))
+    vals = np.take_along_axis(s, part, axis=1)
+    if k < B:
+        # empate no k-ésimo score: argpartition escolhe qualquer um; mantém os de menor índice
+        kth = vals.min(axis=1)
+        for d in np.flatnonzero((s == kth[:, None]).sum(axis=1) > (vals == kth[:, None]).sum(axis=1)):
+            above = np.flatnonzero(s[d] > kth[d])
+            part[d] = np.concatenate([above, np.flatnonzero(s[d] == kth[d])[:k - len(above)]])
+            vals[d] = s[d, part[d]]
+    order = np.lexsort((part, -vals), axis=-1)
+    rank = np.take_along_axis(part, order, axis=1)
+    rank_len = np.minimum(np.isfinite(s).sum(axis=1), k)
+    rank[np.arange(k)[None, :] >= rank_len[:, None]] = -1
+    return rank, rank_len
+
+
+def build_risk_cube(dfH: pd.DataFrame, dfU: pd.DataFrame, thresholds: Dict[str, float],
+                    dfHB: Optional[pd.DataFrame] = None) -> RiskCube:
+    """
+    `dfH`: hazard da cidade (define o eixo de datas). `dfHB` (opcional): tabela longa
+    (date, bairro, H_score, fatores...) que sobrescreve H/fatores por bairro onde existir.
+    """
+    dates = [d.date().isoformat() for d in pd.to_datetime(dfH["date"])]
+    date_pos: Dict[str, int] = {}
+    for i, d in enumerate(dates):
+        date_pos.setdefault(d, i)
+    bairros = dfU["bairro"].astype(str).tolist()
+    bairro_pos: Dict[str, int] = {}
+    for i, b in enumerate(bairros):
+        bairro_pos.setdefault(b, i)
+    D, B = len(dates), len(bairros)
+
+    H_city = dfH["H_score"].to_numpy(dtype=float)
+    H = np.repeat(H_city[:, None], B, axis=1)
+    factors = {k: np.repeat(pd.to_numeric(dfH[k], errors="coerce").to_numpy(dtype=float)[:, None], B, axis=1)
+               for k in HAZARD_FACTORS if k in dfH.columns}
+
+    local_hazard = False
+    if dfHB is not None and len(dfHB):
+        di = np.array([date_pos.get(d.date().isoformat(), -1) for d in pd.to_datetime(dfHB["date"])], dtype=np.int64)
+        bi = np.array([bairro_pos.get(str(b), -1) for b in dfHB["bairro"]], dtype=np.int64)
+        ok = (di >= 0) & (bi >= 0)
+        di, bi = di[ok], bi[ok]
+        H[di, bi] = pd.to_numeric(dfHB["H_score"], errors="coerce").to_numpy(dtype=float)[ok]
+        for k in HAZARD_FACTORS:
+            if k not in dfHB.columns: continue
+            arr = factors.setdefault(k, np.full((D, B), np.nan))
+            arr[di, bi] = pd.to_numeric(dfHB[k], errors="coerce").to_numpy(dtype=float)[ok]
+        local_hazard = bool(ok.any())
+
+    U = dfU.get("U_t", dfU.get("U_static", pd.Series(0.0, index=dfU.index))).fillna(0).to_numpy(dtype=float)
+    U_static = dfU.get("U_static", dfU.get("U_t", pd.Series(0.0, index=dfU.index))).fillna(0).to_numpy(dtype=float)
+    valid = U > 0
+
+    score = np.clip(H * (1 - U)[None, :], 0, 1)
+    score[:, ~valid] = np.nan
+    level = classify_levels(score, thresholds)
+    rank, rank_len = rank_orders(score, valid)
+
+    static = {k: pd.to_numeric(dfU[k], errors="coerce").to_numpy(dtype=float)
+              for k in U_SUBINDICES + INFRA_METRICS if k in dfU.columns}
+
+    for a in [H, H_city, U, U_static, valid, score, level, rank, rank_len, *factors.values(), *static.values()]:
+        a.setflags(write=False)
+    return RiskCube(dates=dates, date_pos=date_pos, bairros=bairros, bairro_pos=bairro_pos,
+                    H=H, H_city=H_city, local_hazard=local_hazard,
+                    U=U, U_static=U_static, valid=valid, score=score, level=level,
+                    factors=factors, static=static, rank=rank, rank_len=rank_len)
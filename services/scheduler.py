@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Atualização periódica do hazard (Open-Meteo -> hazard_forecast.csv).
+
+- Roda o pipeline de apimeteo_conn.run_pipeline em thread (não bloqueia o event loop).
+- Os CSVs são escritos de forma atômica; após cada execução bem-sucedida o callback
+  `on_publish` (na API: SNAPSHOT.refresh(force=True)) troca o snapshot em memória.
+- Também pode rodar como sidecar: `python -m services.scheduler` (a API detecta a
+  troca pelo mtime dos arquivos).
+"""
+
+import asyncio
+import os
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+HAZARD_REFRESH_SECONDS = float(os.getenv("HAZARD_REFRESH_SECONDS", "0"))   # 0 = desativado
+
+
+class HazardScheduler:
+
+    def __init__(self, interval: float = HAZARD_REFRESH_SECONDS, out_dir: Optional[Path] = None,
+                 on_publish: Optional[Callable[[], object]] = None):
+        self.interval = interval
+        self.out_dir = out_dir
+        self.on_publish = on_publish
+        self.last_run: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = asyncio.Lock()
+
+    def _run_sync(self) -> None:
+        # import tardio: requests_cache/retry_requests só são exigidos com o agendador ativo
+        try:
+            from services.apimeteo_conn import run_pipeline, HAZARD_DIR
+        except ImportError:
+            from apimeteo_conn import run_pipeline, HAZARD_DIR
+        run_pipeline(self.out_dir or HAZARD_DIR)
+
+    async def run_once(self) -> bool:
+        async with self._lock:      # nunca duas execuções simultâneas escrevendo os mesmos arquivos
+            try:
+                await asyncio.to_thread(self._run_sync)
+            except Exception as e:
+                # arquivos anteriores continuam intactos (escrita atômica); tenta de novo no próximo ciclo
+                self.last_error = str(e)
+                print(f"⚠️ Falha ao atualizar hazard: {e}")
+                return False
+            if self.on_publish is not None:
+                await asyncio.to_thread(self.on_publish)
+            self.last_run = time.time(); self.last_error = None
+            return True
+
+    async def run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(self.interval)
+
+
+if __name__ == "__main__":
+    interval = HAZARD_REFRESH_SECONDS or 3600.0
+    print(f"🕒 Atualizando hazard a cada {interval:.0f}s (Ctrl+C para sair)")
+    asyncio.run(HazardScheduler(interval).run())
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot compartilhado entre workers (uvicorn --workers N) via Arrow IPC mapeado em memória.
+
+- Um único processo (lock de arquivo) lê os datasets, monta o cubo de risco e a
+  simplificação das geometrias e publica tudo em `v{N}/` como arquivos Arrow IPC
+  sem compressão; `CURRENT` (JSON gravado atomicamente) aponta para a versão
+  publicada e a assinatura (mtimes) dos arquivos-fonte.
+- Os demais workers, ao verem a mesma assinatura, mapeiam os arquivos read-only
+  (pa.memory_map): os arrays do cubo são views NumPy zero-copy sobre o page cache,
+  comum a todos os processos. Nada é reparseado; hazard/U ficam como tabelas Arrow
+  e só viram DataFrame no worker que precisar deles (ex.: /v1/meta, insights).
+- O contador de versão é o mesmo em todos os workers (ETag/caches coerentes).
+- Geometrias shapely não podem ser compartilhadas: cada worker as recria a partir
+  do WKB publicado (sem reler GeoJSON nem refazer coverage_simplify).
+"""
+
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from services.risk_engine import RiskCube
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+    PYARROW_OK = True
+except Exception:
+    PYARROW_OK = False
+
+try:
+    import fcntl
+    FCNTL_OK = True
+except Exception:   # Windows: sem flock, cada worker monta o próprio snapshot
+    FCNTL_OK = False
+
+SHARED_SNAPSHOT_DIR = os.getenv("SHARED_SNAPSHOT_DIR", "")   # vazio = desativado
+KEEP_VERSIONS = 2   # versões mantidas em disco (a anterior pode estar mapeada por um worker)
+
+_CUBE_ARRAYS = ["H", "H_city", "U", "U_static", "valid", "score", "level", "rank", "rank_len"]
+
+
+# ------------------------------ Arrow <-> NumPy ------------------------------
+
+def _list_column(a: np.ndarray) -> "pa.Array":
+    flat = pa.array(np.ascontiguousarray(a).ravel())
+    return pa.LargeListArray.from_arrays(pa.array([0, len(flat)], pa.int64()), flat)
+
+
+def _view(table: "pa.Table", name: str, shape) -> np.ndarray:
+    """View zero-copy (read-only) do array gravado como lista única."""
+    return table.column(name).chunk(0).values.to_numpy(zero_copy_only=True).reshape(shape)
+
+
+def cube_table(cube: RiskCube) -> "pa.Table":
+    arrays = {n: getattr(cube, n) for n in _CUBE_ARRAYS}
+    arrays["valid"] = cube.valid.astype(np.uint8)   # bool do Arrow é bit a bit (não mapeável)
+    arrays.update({f"factor:{k}": v for k, v in cube.factors.items()})
+    arrays.update({f"static:{k}": v for k, v in cube.static.items()})
+    meta = {"dates": cube.dates, "bairros": cube.bairros, "local_hazard": cube.local_hazard,
+            "shapes": {n: list(a.shape) for n, a in arrays.items()}}
+    table = pa.table({n: _list_column(a) for n, a in arrays.items()})
+    return table.replace_schema_metadata({"cube": json.dumps(meta, ensure_ascii=False)})
+
+
+def cube_from_table(table: "pa.Table") -> RiskCube:
+    meta = json.loads(table.schema.metadata[b"cube"])
+    arr = {n: _view(table, n, shape) for n, shape in meta["shapes"].items()}
+    dates, bairros = meta["dates"], meta["bairros"]
+    date_pos: Dict[str, int] = {}
+    for i, d in enumerate(dates):
+        date_pos.setdefault(d, i)
+    bairro_pos: Dict[str, int] = {}
+    for i, b in enumerate(bairros):
+        bairro_pos.setdefault(b, i)   # mesma regra de build_risk_cube: a primeira ocorrência vence
+    return RiskCube(
+        dates=dates, date_pos=date_pos, bairros=bairros, bairro_pos=bairro_pos,
+        H=arr["H"], H_city=arr["H_city"], local_hazard=meta["local_hazard"],
+        U=arr["U"], U_static=arr["U_static"], valid=arr["valid"].view(bool),
+        score=arr["score"], level=arr["level"],
+        factors={n.split(":", 1)[1]: a for n, a in arr.items() if n.startswith("factor:")},
+        static={n.split(":", 1)[1]: a for n, a in arr.items() if n.startswith("static:")},
+        rank=arr["rank"], rank_len=arr["rank_len"],
+    )
+
+
+def geo_table(gdf, shapes: Dict[str, np.ndarray]) -> "pa.Table":
+    import shapely
+    table = pa.Table.from_pandas(pd.DataFrame(gdf.drop(columns=gdf.geometry.name)), preserve_index=False)
+    for level, geoms in shapes.items():
+        table = table.append_column(f"wkb:{level}", pa.array(shapely.to_wkb(geoms), pa.binary()))
+    return table
+
+
+def geo_from_table(table: "pa.Table"):
+    """(GeoDataFrame EPSG:4326, geometrias por nível de detalhe)."""
+    import geopandas as gpd
+    import shapely
+    levels = [n for n in table.column_names if n.startswith("wkb:")]
+    shapes = {n.split(":", 1)[1]: shapely.from_wkb(table.column(n).to_numpy(zero_copy_only=False))
+              for n in levels}
+    props = table.drop_columns(levels).to_pandas(split_blocks=True)
+    return gpd.GeoDataFrame(props, geometry=shapes["full"], crs="EPSG:4326"), shapes
+
+
+# --------------------------------- Arquivos ----------------------------------
+
+def _write_ipc(table: "pa.Table", path: Path) -> None:
+    with pa.OSFile(str(path), "wb") as sink, ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _read_ipc(path: Path) -> "pa.Table":
+    return ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+class SharedSnapshots:
+    """
+    Diretório de snapshots publicados. `load_or_publish(signature, build)` devolve
+    as partes do snapshot mapeadas do disco; só chama `build(version)` (e publica)
+    se nenhum worker publicou ainda a assinatura atual.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads((self.root / "CURRENT").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    @contextmanager
+    def _locked(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.root / "lock", "w") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load_or_publish(self, signature, build: Callable[[int], Dict[str, Any]]) -> Dict[str, Any]:
+        sig = list(signature)
+        entry = self.current()
+        if entry is None or entry["signature"] != sig:
+            with self._locked():
+                entry = self.current()   # outro worker pode ter publicado enquanto esperávamos
+                if entry is None or entry["signature"] != sig:
+                    version = (entry["version"] if entry else 0) + 1
+                    entry = self.publish(version, sig, build(version))
+        return self.load(entry)
+
+    def publish(self, version: int, signature, parts: Dict[str, Any]) -> Dict[str, Any]:
+        name = f"v{version}"
+        tmp = self.root / f".{name}.{os.getpid()}.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        _write_ipc(cube_table(parts["cube"]), tmp / "cube.arrow")
+        _write_ipc(pa.Table.from_pandas(parts["hazard"], preserve_index=False), tmp / "hazard.arrow")
+        _write_ipc(pa.Table.from_pandas(parts["u"], preserve_index=False), tmp / "u.arrow")
+        _write_ipc(geo_table(parts["geo"], parts["shapes"]), tmp / "geo.arrow")
+        (tmp / "meta.json").write_text(json.dumps(
+            {k: parts[k] for k in ("weights", "thresholds", "population")}, ensure_ascii=False), encoding="utf-8")
+        shutil.rmtree(self.root / name, ignore_errors=True)
+        os.replace(tmp, self.root / name)
+        entry = {"version": version, "dir": name, "signature": list(signature)}
+        pointer = self.root / f".CURRENT.{os.getpid()}.tmp"
+        pointer.write_text(json.dumps(entry), encoding="utf-8")
+        os.replace(pointer, self.root / "CURRENT")
+        self._prune(version)
+        print(f"📦 Snapshot v{version} publicado em {self.root / name}")
+        return entry
+
+    def _prune(self, version: int) -> None:
+        # arquivos ainda mapeados continuam válidos após o unlink (POSIX)
+        for p in self.root.glob("v*"):
+            try:
+                if int(p.name[1:]) <= version - KEEP_VERSIONS:
+                    shutil.rmtree(p, ignore_errors=True)
+            except ValueError:
+                pass
+
+    def load(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        base = self.root / entry["dir"]
+        geo, shapes = geo_from_table(_read_ipc(base / "geo.arrow"))
+        meta = json.loads((base / "meta.json").read_text(encoding="utf-8"))
+        return {
+            "version": entry["version"],
+            "cube": cube_from_table(_read_ipc(base / "cube.arrow")),
+            "hazard": _read_ipc(base / "hazard.arrow"),   # Arrow mapeado; DataFrame só se usado
+            "u": _read_ipc(base / "u.arrow"),
+            "geo": geo, "shapes": shapes, **meta,
+        }
+
+
+def shared_snapshots() -> Optional[SharedSnapshots]:
+    """SharedSnapshots de SHARED_SNAPSHOT_DIR, ou None (desativado/sem pyarrow/sem flock)."""
+    if not SHARED_SNAPSHOT_DIR:
+        return None
+    if not (PYARROW_OK and FCNTL_OK):
+        print("⚠️ SHARED_SNAPSHOT_DIR ignorado: requer pyarrow e fcntl (POSIX)")
+        return None
+    return SharedSnapshots(Path(SHARED_SNAPSHOT_DIR))
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+Snapshot imutável dos dados servidos pela API.
+
+- Hazard, U (tabela + geometria + GeometryStore), pesos/thresholds e população são lidos uma única vez.
+- O snapshot corrente é trocado atomicamente quando o mtime de algum arquivo-fonte muda.
+- Handlers leem apenas da memória; nunca alteram os DataFrames do snapshot.
+- Hazard/U podem vir como tabelas Arrow mapeadas (snapshot compartilhado entre workers);
+  o DataFrame só é montado no primeiro acesso a `hazard`/`u`.
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import geopandas as gpd
+import pandas as pd
+
+from services.risk_engine import RiskCube
+from services.geo_render import GeoFeatures
+from services.geometry_store import GeometryStore
+
+Signature = Tuple[Optional[int], ...]
+
+
+@dataclass(frozen=True)
+class DataSnapshot:
+    version: int
+    signature: Signature
+    loaded_at: float
+    hazard_table: Any               # pd.DataFrame ou pyarrow.Table
+    u_table: Any
+    geo: gpd.GeoDataFrame
+    weights: Dict[str, Any]
+    thresholds: Dict[str, float]
+    population: Dict[str, float]
+    cube: RiskCube
+    geo_features: GeoFeatures
+    geom: GeometryStore             # WGS84 + CRS métrico, centróides/áreas pré-calculados
+
+    @cached_property
+    def hazard(self) -> pd.DataFrame:
+        return _frame(self.hazard_table)
+
+    @cached_property
+    def u(self) -> pd.DataFrame:
+        return _frame(self.u_table)
+
+
+def _frame(table) -> pd.DataFrame:
+    return table if isinstance(table, pd.DataFrame) else table.to_pandas(split_blocks=True)
+
+
+def files_signature(paths: List[Path]) -> Signature:
+    """mtime (ns) de cada arquivo; None se ausente."""
+    sig = []
+    for p in paths:
+        try:
+            sig.append(p.stat().st_mtime_ns)
+        except OSError:
+            sig.append(None)
+    return tuple(sig)
+
+
+class SnapshotStore:
+    """
+    Mantém o snapshot corrente. `get()` custa um stat() por arquivo no máximo
+    a cada `check_interval` segundos; a reconstrução acontece fora do caminho
+    dos leitores e a troca é uma única atribuição de referência.
+    """
+
+    def __init__(self, sources: List[Path], builder: Callable[[int, Signature], Any],
+                 check_interval: float = 2.0):
+        self.sources = list(sources)
+        self.builder = builder
+        self.check_interval = check_interval
+        self._snap = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        snap = self._snap
+        now = time.monotonic()
+        if snap is not None and now - self._checked < self.check_interval:
+            return snap
+        self._checked = now
+        if snap is not None and files_signature(self.sources) == snap.signature:
+            return snap
+        return self.refresh()
+
+    def refresh(self, force: bool = False):
+        with self._lock:
+            snap = self._snap
+            sig = files_signature(self.sources)
+            if snap is not None and not force and sig == snap.signature:
+                return snap
+            version = snap.version + 1 if snap is not None else 1
+            try:
+                new = self.builder(version, sig)
+            except Exception as e:
+                if snap is None:
+                    raise
+                # mantém o snapshot anterior (ex.: arquivo sendo reescrito); tenta de novo no próximo ciclo
+                print(f"⚠️ Falha ao recarregar snapshot (mantendo v{snap.version}): {e}")
+                return snap
+            self._snap = new
+            self._checked = time.monotonic()
+            return new
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Leitura/escrita dos datasets (hazard, U, risco) em formato colunar.
+
+- Formato primário: Parquet (tabelas) e GeoParquet (geometria), lidos com memory map
+  e colunas tipadas. O CSV/GeoJSON continua disponível como exportação opcional
+  (DATA_EXPORT_CSV=1) e como fallback quando o pyarrow não está instalado.
+- Os caminhos continuam sendo os nomes históricos (`x.csv`, `x.geojson`); os irmãos
+  colunares são `x.parquet` e `x.geo.parquet`.
+- Leitura: usa o arquivo mais novo entre o colunar e o texto (um CSV regravado
+  depois do Parquet não é ignorado).
+- Escrita atômica (arquivo temporário + os.replace): leitores nunca veem arquivo pela metade.
+"""
+
+import os
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_OK = True
+except Exception:
+    PYARROW_OK = False
+
+DATA_FORMAT = os.getenv("DATA_FORMAT", "parquet" if PYARROW_OK else "csv")   # parquet | csv
+DATA_EXPORT_CSV = os.getenv("DATA_EXPORT_CSV", "0") == "1"                  # CSV/GeoJSON além do Parquet
+
+
+def parquet_path(path: Path) -> Path:
+    """Irmão Parquet de um caminho histórico: x.csv -> x.parquet, x.geojson -> x.geo.parquet."""
+    path = Path(path)
+    base = path.name.split(".")[0]
+    return path.with_name(base + (".geo.parquet" if path.suffix == ".geojson" else ".parquet"))
+
+
+def sources(path: Path) -> List[Path]:
+    """Arquivos que podem conter o dataset (para assinatura por mtime)."""
+    return [parquet_path(path), Path(path)]
+
+
+def resolve(path: Path) -> Optional[Path]:
+    """Arquivo a ler: o mais novo entre Parquet (se pyarrow disponível) e texto; None se nenhum existe."""
+    found = []
+    for p in ([parquet_path(path)] if PYARROW_OK else []) + [Path(path)]:
+        try:
+            found.append((p.stat().st_mtime_ns, p.suffix == ".parquet", p))
+        except OSError:
+            pass
+    return max(found)[2] if found else None
+
+
+def exists(path: Path) -> bool:
+    return resolve(path) is not None
+
+
+def _atomic(path: Path, write: Callable[[Path], None]) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+        raise
+
+
+def write_csv_atomic(df: pd.DataFrame, path: Path) -> None:
+    def _write(tmp: Path):
+        with open(tmp, "w", newline="") as f:
+            df.to_csv(f, index=False)
+    _atomic(Path(path), _write)
+
+
+def write_table(df: pd.DataFrame, path: Path) -> Path:
+    """Grava no formato primário (e CSV se DATA_EXPORT_CSV); retorna o arquivo primário."""
+    path = Path(path)
+    if DATA_FORMAT == "parquet" and PYARROW_OK:
+        out = parquet_path(path)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _atomic(out, lambda tmp: pq.write_table(table, tmp, compression="zstd"))
+        if DATA_EXPORT_CSV:
+            write_csv_atomic(df, path)
+        return out
+    write_csv_atomic(df, path)
+    return path
+
+
+def read_table(path: Path, columns: Optional[Sequence[str]] = None,
+               dates: Sequence[str] = ()) -> pd.DataFrame:
+    """Lê o dataset (Parquet via memory map ou CSV); colunas em `dates` viram datetime64."""
+    src = resolve(path)
+    if src is None:
+        raise FileNotFoundError(str(path))
+    if src.suffix == ".parquet":
+        df = pq.read_table(src, columns=list(columns) if columns else None, memory_map=True).to_pandas()
+    else:
+        df = pd.read_csv(src, usecols=list(columns) if columns else None)
+    for c in dates:
+        if c in df.columns:
+            df[c] = pd.to_datetime(df[c])
+    return df
+
+
+def write_geo(gdf, path: Path) -> Path:
+    """GeoParquet no formato primário (e GeoJSON se DATA_EXPORT_CSV); retorna o arquivo primário."""
+    path = Path(path)
+    if DATA_FORMAT == "parquet" and PYARROW_OK:
+        out = parquet_path(path)
+        _atomic(out, lambda tmp: gdf.to_parquet(tmp, index=False, compression="zstd"))
+        if DATA_EXPORT_CSV:
+            _atomic(path, lambda tmp: gdf.to_file(tmp, driver="GeoJSON"))
+        return out
+    _atomic(path, lambda tmp: gdf.to_file(tmp, driver="GeoJSON"))
+    return path
+
+
+def read_geo(path: Path):
+    import geopandas as gpd
+    src = resolve(path)
+    if src is None:
+        raise FileNotFoundError(str(path))
+    if src.suffix == ".parquet":
+        return gpd.read_parquet(src, memory_map=True)
+    return gpd.read_file(src)
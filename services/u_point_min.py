@@ -4,7 +4,10 @@ Gera U por bairro (Canoas/RS) com OSM + Open‑Meteo e exporta GeoJSON + CSV.
 
 Passos:
 1) Baixa/usa cache do GeoJSON oficial dos bairros (GeoCanoas, ArcGIS REST).
-2) P/ cada bairro, busca OSM (Overpass) no bbox, intersecta com o polígono:
+2) Busca OSM (Overpass) uma única vez para a cidade (bbox dividido em tiles baixados
+   em paralelo, um mirror por tile) e reparte os elementos localmente entre todos os
+   bairros numa só passada (STRtree dos bairros -> pares feição x bairro -> interseções
+   vetorizadas):
    - vias pavimentadas (km)
    - drenos/valas (km)
    - canais (km)
@@ -15,21 +18,31 @@ Passos:
 5) Exporta: data/u/canoas_bairros_u.geojson e data/u/canoas_bairros_u.csv
 """
 
+import asyncio
 import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Tuple
 
 import geopandas as gpd
 import numpy as np
 import pandas as pd
 import requests
-import requests_cache
-from retry_requests import retry
-from shapely.geometry import LineString, Polygon, Point, shape
+import shapely
 from shapely.ops import unary_union
 from pyproj import Transformer
-import openmeteo_requests
-from datetime import date
+
+try:
+    from services.meteo_async import AsyncOpenMeteo
+    from services.dryness import fetch_grid, dynamic_u
+    from services.geometry_store import build_geometry_store, metric_transformers, project, store_path
+    from services import storage
+except ImportError:  # executado como script dentro de services/
+    from meteo_async import AsyncOpenMeteo
+    from dryness import fetch_grid, dynamic_u
+    from geometry_store import build_geometry_store, metric_transformers, project, store_path
+    import storage
 
 # ------------------ Config ------------------
 
@@ -48,14 +61,8 @@ OVERPASS_URLS = [
     "https://overpass.kumi.systems/api/interpreter",
     "https://overpass.openstreetmap.ru/api/interpreter"
 ]
-
-# Open‑Meteo client with cache/retry
-cache_session = requests_cache.CachedSession('.cache', expire_after=1800)
-retry_session = retry(cache_session, retries=3, backoff_factor=0.3)
-om = openmeteo_requests.Client(session=retry_session)
-
-FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-TZ = "America/Sao_Paulo"
+# bbox da cidade dividido em OVERPASS_TILES x OVERPASS_TILES consultas concorrentes
+OVERPASS_TILES = int(os.getenv("OVERPASS_TILES", "2"))
 
 # Pesos U_min (re-normaliza se algo faltar)
 WEIGHTS = {"perm": 0.40, "macro": 0.25, "cob": 0.20, "micro": 0.15}
@@ -66,10 +73,8 @@ ANCHORS = {
     "dreno_km_km2":    (0.05, 0.50),  # dreno/vala por km²
     "canal_km_km2":    (0.10, 1.00),  # canal por km²
     "frac_verde":      (0.05, 0.30),  # fração verde no bairro
-    "sm_clamp":        (0.10, 0.45),  # umidade solo (m3/m3)
-    "et_day":          (1.0, 6.0)     # ET diária (mm)
 }
-DELTA_DRYNESS = 0.10  # ganho dinâmico
+# âncoras de sm/ET e o ganho dinâmico ficam em services/dryness.py (compartilhadas com a API)
 
 # ------------------ Utils ------------------
 
@@ -85,16 +90,10 @@ def scale_linear(x: float, lo: float, hi: float, invert: bool = False) -> float:
 
 def projectors(lat: float, lon: float):
     """
-    Usa UTM 22S (EPSG:31982) para Canoas/RS; fallback: WebMercator.
+    Usa UTM 22S (EPSG:31982) para Canoas/RS; fallback: WebMercator (transformers em cache).
     """
-    try:
-        to_xy = Transformer.from_crs("EPSG:4326", "EPSG:31982", always_xy=True)
-        to_ll = Transformer.from_crs("EPSG:31982", "EPSG:4326", always_xy=True)
-        return to_xy, to_ll
-    except Exception:
-        to_xy = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-        to_ll = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-        return to_xy, to_ll
+    to_xy, to_ll, _ = metric_transformers()
+    return to_xy, to_ll
 
 def ensure_bairros_geojson(out_path: Path) -> None:
     if out_path.exists():
@@ -110,154 +109,172 @@ def ensure_bairros_geojson(out_path: Path) -> None:
             continue
     raise RuntimeError("Não foi possível baixar o GeoJSON de bairros do GeoCanoas.")
 
-def overpass(query: str) -> Dict[str, Any]:
-    for u in OVERPASS_URLS:
+def overpass(query: str, start: int = 0) -> Dict[str, Any]:
+    """POST no primeiro mirror que responder, começando por OVERPASS_URLS[start]."""
+    urls = OVERPASS_URLS[start % len(OVERPASS_URLS):] + OVERPASS_URLS[:start % len(OVERPASS_URLS)]
+    for u in urls:
         try:
-            r = requests.post(u, data={"data": query}, timeout=120)
+            r = requests.post(u, data={"data": query}, timeout=180)
             if r.ok:
                 return r.json()
         except Exception:
             continue
     raise RuntimeError("Overpass sem resposta (tente novamente).")
 
-def lines_length_km(elems: List[Dict[str,Any]], poly_xy, to_xy) -> float:
-    total = 0.0
-    for e in elems:
-        if "geometry" not in e:
-            continue
-        coords = [(p["lon"], p["lat"]) for p in e["geometry"]]
-        if len(coords) < 2:
-            continue
-        xys = [to_xy.transform(x, y) for x, y in coords]
-        line = LineString(xys)
-        inter = line.intersection(poly_xy)
-        if not inter.is_empty:
-            total += inter.length
-    return total / 1000.0
-
-def polygons_area_km2(elems: List[Dict[str,Any]], poly_xy, to_xy) -> float:
-    total = 0.0
-    for e in elems:
-        if "geometry" not in e:
-            continue
-        coords = [(p["lon"], p["lat"]) for p in e["geometry"]]
-        if len(coords) < 3:
-            continue
-        xys = [to_xy.transform(x, y) for x, y in coords]
-        geom = Polygon(xys)
-        if not geom.is_valid:
-            geom = geom.buffer(0)
-        inter = geom.intersection(poly_xy)
-        if not inter.is_empty:
-            total += inter.area
-    return total / 1e6
-
-def point_in_poly_count(nodes: List[Dict[str,Any]], poly_xy, to_xy) -> int:
-    count = 0
-    for n in nodes:
-        if "lon" in n and "lat" in n:
-            x,y = to_xy.transform(n["lon"], n["lat"])
-            if Point(x,y).within(poly_xy):
-                count += 1
-    return count
-
-def fetch_osm_metrics_for_polygon(poly_wgs: Polygon) -> Dict[str,float]:
-    # bbox em WGS84
-    minx, miny, maxx, maxy = poly_wgs.bounds  # lon/lat
-    # consulta Overpass no bbox
-    q = f"""
-    [out:json][timeout:60];
+def overpass_query(bbox: Tuple[float, float, float, float], timeout: int = 60) -> str:
+    minx, miny, maxx, maxy = bbox  # lon/lat
+    b = f"{miny},{minx},{maxy},{maxx}"
+    return f"""
+    [out:json][timeout:{timeout}];
     (
-      way({miny},{minx},{maxy},{maxx})["highway"]["surface"~"asphalt|paved|concrete"];
-      way({miny},{minx},{maxy},{maxx})["waterway"~"drain|ditch"];
-      way({miny},{minx},{maxy},{maxx})["waterway"="canal"];
-      way({miny},{minx},{maxy},{maxx})["landuse"~"grass|forest|meadow|recreation_ground|park"];
-      way({miny},{minx},{maxy},{maxx})["natural"~"wood|scrub|grassland|heath|wetland"];
-      way({miny},{minx},{maxy},{maxx})["leisure"="park"];
-      node({miny},{minx},{maxy},{maxx})["man_made"="pumping_station"];
+      way({b})["highway"]["surface"~"asphalt|paved|concrete"];
+      way({b})["waterway"~"drain|ditch"];
+      way({b})["waterway"="canal"];
+      way({b})["landuse"~"grass|forest|meadow|recreation_ground|park"];
+      way({b})["natural"~"wood|scrub|grassland|heath|wetland"];
+      way({b})["leisure"="park"];
+      node({b})["man_made"="pumping_station"];
     );
     out tags geom;
     """
-    data = overpass(q)
-    elements = data.get("elements", [])
-
-    paved = [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("highway") and e.get("tags",{}).get("surface")]
-    drain = [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("waterway") in ("drain","ditch")]
-    canal = [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("waterway") == "canal"]
-    greens= [e for e in elements if e.get("type") == "way"  and (
-                e.get("tags",{}).get("landuse") in ("grass","forest","meadow","recreation_ground","park")
-             or e.get("tags",{}).get("natural") in ("wood","scrub","grassland","heath","wetland")
-             or e.get("tags",{}).get("leisure") == "park")]
-    pumps = [e for e in elements if e.get("type") == "node" and e.get("tags",{}).get("man_made") == "pumping_station"]
-
-    # projeta para CRS métrico
-    # usa centróide para escolher projeção local
-    c = poly_wgs.centroid
-    to_xy, _ = projectors(c.y, c.x)
-    poly_xy = Polygon([to_xy.transform(x,y) for x,y in np.array(poly_wgs.exterior.coords)])
-
-    area_km2 = poly_xy.area / 1e6
-    paved_km  = lines_length_km(paved, poly_xy, to_xy)
-    drain_km  = lines_length_km(drain, poly_xy, to_xy)
-    canal_km  = lines_length_km(canal, poly_xy, to_xy)
-    green_km2 = polygons_area_km2(greens, poly_xy, to_xy)
-    pumps_n   = point_in_poly_count(pumps, poly_xy, to_xy)
-
-    return {
-        "area_km2": area_km2,
-        "paved_km": paved_km,
-        "drain_km": drain_km,
-        "canal_km": canal_km,
-        "green_km2": green_km2,
-        "pumps_n": pumps_n
-    }
 
-def fetch_dryness(lat: float, lon: float) -> Dict[str,Any]:
-    hourly_vars = ["evapotranspiration","soil_moisture_0_to_1cm"]
-    params = {
-        "latitude": lat, "longitude": lon, "timezone": TZ,
-        "forecast_days": 1, "past_days": 2, "hourly": hourly_vars
-    }
-    resp = om.weather_api(FORECAST_URL, params=params)[0]
-    h = resp.Hourly()
-    times = pd.date_range(
-        start=pd.to_datetime(h.Time(), unit="s", utc=True),
-        end=pd.to_datetime(h.TimeEnd(), unit="s", utc=True),
-        freq=pd.Timedelta(seconds=h.Interval()),
-        inclusive="left"
-    )
-    df = pd.DataFrame({"time": times})
-    for i in range(h.VariablesLength()):
-        name = hourly_vars[i] if i < len(hourly_vars) else f"var_{i}"
-        try:
-            df[name] = h.Variables(i).ValuesAsNumpy()
-        except Exception:
-            df[name] = np.nan
-    df["time_local"] = df["time"].dt.tz_convert(TZ)
-    df["date"] = df["time_local"].dt.date
-
-    # ET do último dia completo
-    last_day = df["date"].iloc[-1]
-    et24 = float(df[df["date"] == last_day]["evapotranspiration"].sum()) if "evapotranspiration" in df else np.nan
-    # SM média das últimas 6h
-    sm6  = float(df.tail(6)["soil_moisture_0_to_1cm"].mean()) if "soil_moisture_0_to_1cm" in df else np.nan
-
-    sm_lo, sm_hi = ANCHORS["sm_clamp"]
-    et_lo, et_hi = ANCHORS["et_day"]
-    sm_norm = scale_linear(sm6, sm_lo, sm_hi) if sm6 == sm6 else 0.5
-    et_scaled = scale_linear(et24, et_lo, et_hi) if et24 == et24 else 0.5
-    dryness = 0.5*(1.0 - sm_norm) + 0.5*et_scaled
+def split_bbox(bbox: Tuple[float, float, float, float], n: int) -> List[Tuple[float, float, float, float]]:
+    minx, miny, maxx, maxy = bbox
+    xs = np.linspace(minx, maxx, n + 1); ys = np.linspace(miny, maxy, n + 1)
+    return [(xs[i], ys[j], xs[i + 1], ys[j + 1]) for j in range(n) for i in range(n)]
 
+def fetch_osm_elements(bbox: Tuple[float, float, float, float], tiles: int = OVERPASS_TILES) -> List[Dict[str, Any]]:
+    """
+    Elementos OSM de todo o bbox (cidade). Tiles baixados em paralelo, cada um começando
+    num mirror diferente; elementos repetidos entre tiles (vias na divisa) são deduplicados.
+    """
+    parts = split_bbox(bbox, max(1, tiles))
+    with ThreadPoolExecutor(max_workers=min(len(parts), len(OVERPASS_URLS))) as pool:
+        results = list(pool.map(lambda it: overpass(overpass_query(it[1], timeout=180), start=it[0]),
+                                enumerate(parts)))
+    seen, elements = set(), []
+    for data in results:
+        for e in data.get("elements", []):
+            key = (e.get("type"), e.get("id"))
+            if key in seen:
+                continue
+            seen.add(key); elements.append(e)
+    return elements
+
+def classify_elements(elements: List[Dict[str, Any]]) -> Dict[str, List[Dict[str, Any]]]:
+    """Separa os elementos nas camadas usadas pelas métricas."""
     return {
-        "calc_date": str(last_day),
-        "et24_mm": None if et24 != et24 else et24,
-        "sm6_m3m3": None if sm6 != sm6 else sm6,
-        "sm_norm": clamp01(sm_norm),
-        "et_scaled": clamp01(et_scaled),
-        "dryness": clamp01(dryness)
+        "paved": [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("highway") and e.get("tags",{}).get("surface")],
+        "drain": [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("waterway") in ("drain","ditch")],
+        "canal": [e for e in elements if e.get("type") == "way"  and e.get("tags",{}).get("waterway") == "canal"],
+        "greens": [e for e in elements if e.get("type") == "way"  and (
+                      e.get("tags",{}).get("landuse") in ("grass","forest","meadow","recreation_ground","park")
+                   or e.get("tags",{}).get("natural") in ("wood","scrub","grassland","heath","wetland")
+                   or e.get("tags",{}).get("leisure") == "park")],
+        "pumps": [e for e in elements if e.get("type") == "node" and e.get("tags",{}).get("man_made") == "pumping_station"],
     }
 
-def compute_u_from_metrics(metrics: Dict[str,float], centroid_lat: float, centroid_lon: float) -> Dict[str,Any]:
+def layer_geometries(elems: List[Dict[str,Any]], kind: str) -> np.ndarray:
+    """
+    Geometrias WGS84 (construtores vetorizados do shapely 2) de uma camada OSM:
+    kind = "line" (>= 2 vértices), "polygon" (>= 3) ou "point".
+    """
+    if kind == "point":
+        pts = np.array([(n["lon"], n["lat"]) for n in elems if "lon" in n and "lat" in n], dtype=float)
+        return shapely.points(pts) if len(pts) else np.empty(0, dtype=object)
+    min_n = 2 if kind == "line" else 3
+    rings = [e["geometry"] for e in elems if "geometry" in e and len(e["geometry"]) >= min_n]
+    if not rings:
+        return np.empty(0, dtype=object)
+    coords = np.array([(p["lon"], p["lat"]) for g in rings for p in g], dtype=float)
+    idx = np.repeat(np.arange(len(rings)), [len(g) for g in rings])
+    if kind == "line":
+        return shapely.linestrings(coords, indices=idx)
+    return shapely.polygons(shapely.linearrings(coords, indices=idx))
+
+def _pairs(tree: "shapely.STRtree", geoms: np.ndarray, predicate: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Pares (feição, bairro) candidatos via STRtree."""
+    if len(geoms) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return tree.query(geoms, predicate=predicate)
+
+def lines_length_km(lines_xy: np.ndarray, polys_xy: np.ndarray, tree: "shapely.STRtree") -> np.ndarray:
+    f, b = _pairs(tree, lines_xy, "intersects")
+    lengths = shapely.length(shapely.intersection(lines_xy[f], polys_xy[b]))
+    return np.bincount(b, weights=lengths, minlength=len(polys_xy)) / 1000.0
+
+def polygons_area_km2(polys_xy_osm: np.ndarray, polys_xy: np.ndarray, tree: "shapely.STRtree") -> np.ndarray:
+    geoms = polys_xy_osm.copy()
+    bad = ~shapely.is_valid(geoms)
+    geoms[bad] = shapely.buffer(geoms[bad], 0)
+    f, b = _pairs(tree, geoms, "intersects")
+    areas = shapely.area(shapely.intersection(geoms[f], polys_xy[b]))
+    return np.bincount(b, weights=areas, minlength=len(polys_xy)) / 1e6
+
+def point_in_poly_count(points_xy: np.ndarray, polys_xy: np.ndarray, tree: "shapely.STRtree") -> np.ndarray:
+    _, b = _pairs(tree, points_xy, "within")
+    return np.bincount(b, minlength=len(polys_xy))
+
+def osm_metrics_for_polygons(polys_xy: np.ndarray, layers: Dict[str, List[Dict[str, Any]]],
+                             to_xy: Transformer) -> List[Dict[str,float]]:
+    """
+    Métricas OSM de todos os polígonos (já no CRS métrico, ex.: GeometryStore.xy) de uma vez:
+    camadas projetadas em lote, candidatos (feição x bairro) por STRtree e
+    intersection/length/area vetorizados.
+    """
+    # só o anel externo de cada bairro (como no cálculo por polígono)
+    polys_xy = shapely.polygons(shapely.get_exterior_ring(polys_xy))
+    tree = shapely.STRtree(polys_xy)
+
+    area_km2  = shapely.area(polys_xy) / 1e6
+    paved_km  = lines_length_km(project(layer_geometries(layers["paved"], "line"), to_xy), polys_xy, tree)
+    drain_km  = lines_length_km(project(layer_geometries(layers["drain"], "line"), to_xy), polys_xy, tree)
+    canal_km  = lines_length_km(project(layer_geometries(layers["canal"], "line"), to_xy), polys_xy, tree)
+    green_km2 = polygons_area_km2(project(layer_geometries(layers["greens"], "polygon"), to_xy), polys_xy, tree)
+    pumps_n   = point_in_poly_count(project(layer_geometries(layers["pumps"], "point"), to_xy), polys_xy, tree)
+
+    return [
+        {
+            "area_km2": float(area_km2[i]),
+            "paved_km": float(paved_km[i]),
+            "drain_km": float(drain_km[i]),
+            "canal_km": float(canal_km[i]),
+            "green_km2": float(green_km2[i]),
+            "pumps_n": int(pumps_n[i])
+        }
+        for i in range(len(polys_xy))
+    ]
+
+def fetch_dryness(lats: List[float], lons: List[float]) -> List[Dict[str,Any]]:
+    """
+    Dryness do último dia (hoje) para cada centróide. Centróides na mesma célula
+    da grade compartilham a série; uma única requisição multi-localização.
+    """
+    async def _fetch():
+        client = AsyncOpenMeteo()
+        try:
+            return await fetch_grid(client, lats, lons, past_days=2, forecast_days=1)
+        finally:
+            await client.aclose()
+
+    grid = asyncio.run(_fetch())
+    last_day = grid.dates[-1]
+    out = []
+    for c in grid.cell_index(lats, lons):
+        f = lambda a, default=None: default if np.isnan(a[-1, c]) else float(a[-1, c])
+        sm_norm = f(grid.sm_norm, 0.5)
+        et_scaled = f(grid.et_scaled, 0.5)
+        out.append({
+            "calc_date": last_day,
+            "et24_mm": f(grid.et24),
+            "sm6_m3m3": f(grid.sm6),
+            "sm_norm": clamp01(sm_norm),
+            "et_scaled": clamp01(et_scaled),
+            "dryness": clamp01(0.5*(1.0 - sm_norm) + 0.5*et_scaled)
+        })
+    return out
+
+def compute_u_from_metrics(metrics: Dict[str,float]) -> Dict[str,Any]:
     area = max(1e-6, metrics["area_km2"])
     dens_pav = metrics["paved_km"] / area
     dreno_km2 = metrics["drain_km"] / area
@@ -278,11 +295,6 @@ def compute_u_from_metrics(metrics: Dict[str,float], centroid_lat: float, centro
     U_static = clamp01(weights["perm"]*u_perm + weights["macro"]*u_macro +
                        weights["cob"]*u_cob + weights["micro"]*u_micro)
 
-    dyn = fetch_dryness(centroid_lat, centroid_lon)
-    dryness = dyn["dryness"]
-    U_t = clamp01(U_static + DELTA_DRYNESS*(dryness - 0.5))
-    frag_t = clamp01(1.0 - U_t)
-
     return {
         "densities": {
             "dens_pav_km_km2": round(dens_pav,3),
@@ -297,10 +309,7 @@ def compute_u_from_metrics(metrics: Dict[str,float], centroid_lat: float, centro
             "u_permeabilidade": round(u_perm,3)
         },
         "weights": weights,
-        "U_static": round(U_static,3),
-        "dynamic": dyn,
-        "U_t": round(U_t,3),
-        "Fragilidade_t": round(frag_t,3)
+        "U_static": U_static,
     }
 
 # ------------------ Main flow ------------------
@@ -325,27 +334,39 @@ def main():
     if name_field is None:
         name_field = "OBJECTID"  # fallback
 
-    rows = []
-    geoms = []
+    # força polígono simples (trata MultiPolygon)
+    items = []
     for idx, row in gdf.iterrows():
         geom_wgs = row.geometry
         if geom_wgs is None or geom_wgs.is_empty:
             continue
-        # força polígono simples (trata MultiPolygon)
         if geom_wgs.geom_type == "MultiPolygon":
             geom_wgs = unary_union([poly for poly in geom_wgs.geoms if poly.area > 0])
         if geom_wgs.is_empty:
             continue
+        items.append((idx, row, geom_wgs))
+
+    # geometrias WGS84 + métricas (projetadas uma vez), persistidas junto do GeoJSON de saída
+    store = build_geometry_store([str(row.get(name_field, f"bair_{idx}")) for idx, row, _ in items],
+                                 [g for _, _, g in items])
 
-        # 2) Métricas OSM por polígono
-        metrics = fetch_osm_metrics_for_polygon(geom_wgs)
+    # 2) OSM da cidade inteira (tiles em paralelo) e métricas por polígono, localmente
+    minx, miny, maxx, maxy = store.bounds.T
+    layers = classify_elements(fetch_osm_elements((minx.min(), miny.min(), maxx.max(), maxy.max())))
+    to_xy, _ = projectors(float(store.lat.mean()), float(store.lon.mean()))
+    all_metrics = osm_metrics_for_polygons(store.xy, layers, to_xy)
 
-        # 3) Centróide para dinâmica Open‑Meteo
-        c = geom_wgs.centroid
-        ures = compute_u_from_metrics(metrics, centroid_lat=c.y, centroid_lon=c.x)
+    rows = []
+    geoms = []
+    u_static = []
+    for (idx, row, geom_wgs), name, metrics in zip(items, store.bairros, all_metrics):
+
+        # 3) Sub-índices + U_static (centróides da dinâmica Open‑Meteo vêm do store)
+        ures = compute_u_from_metrics(metrics)
+        u_static.append(ures["U_static"])
 
         props = {
-            "bairro": str(row.get(name_field, f"bair_{idx}")),
+            "bairro": name,
             "area_km2": round(metrics["area_km2"], 4),
             "paved_km": round(metrics["paved_km"], 3),
             "drain_km": round(metrics["drain_km"], 3),
@@ -360,28 +381,35 @@ def main():
             "u_micro": ures["subindices"]["u_micro"],
             "u_macro": ures["subindices"]["u_macro"],
             "u_permeabilidade": ures["subindices"]["u_permeabilidade"],
-            "U_static": ures["U_static"],
-            "dryness_date": ures["dynamic"]["calc_date"],
-            "sm_norm": ures["dynamic"]["sm_norm"],
-            "et_scaled": ures["dynamic"]["et_scaled"],
-            "dryness": ures["dynamic"]["dryness"],
-            "U_t": ures["U_t"],
-            "Fragilidade_t": ures["Fragilidade_t"],
+            "U_static": round(ures["U_static"],3),
         }
         rows.append(props)
         geoms.append(geom_wgs)
 
+    # 4) Dryness de todos os bairros (uma requisição) -> U(t) vetorizado
+    dyn = fetch_dryness(store.lat.tolist(), store.lon.tolist())
+    U_t = dynamic_u(np.array(u_static), np.array([d["dryness"] for d in dyn]))
+    for props, d, u in zip(rows, dyn, U_t):
+        props.update({
+            "dryness_date": d["calc_date"],
+            "sm_norm": d["sm_norm"],
+            "et_scaled": d["et_scaled"],
+            "dryness": d["dryness"],
+            "U_t": round(float(u),3),
+            "Fragilidade_t": round(clamp01(1.0 - float(u)),3),
+        })
+
     out_gdf = gpd.GeoDataFrame(rows, geometry=geoms, crs="EPSG:4326")
 
-    # 4) Exporta GeoJSON + CSV tabular
-    out_geo = DATA_DIR / "canoas_bairros_u.geojson"
-    out_csv = DATA_DIR / "canoas_bairros_u.csv"
-    out_gdf.to_file(out_geo, driver="GeoJSON")
-    pd.DataFrame(rows).to_csv(out_csv, index=False)
+    # 5) Exporta geometria (GeoParquet/GeoJSON) + tabela (Parquet/CSV), conforme DATA_FORMAT
+    out_geo = storage.write_geo(out_gdf, DATA_DIR / "canoas_bairros_u.geojson")
+    out_csv = storage.write_table(pd.DataFrame(rows), DATA_DIR / "canoas_bairros_u.csv")
+    store.save(store_path(out_geo))   # depois da geometria: mtime mais novo => válido para a API
 
     print(f"OK: {len(out_gdf)} bairros.")
-    print(f"- GeoJSON: {out_geo}")
-    print(f"- CSV    : {out_csv}")
+    print(f"- Geometria: {out_geo}")
+    print(f"- Tabela   : {out_csv}")
+    print(f"- Geom     : {store_path(out_geo)}")
 
 if __name__ == "__main__":
     main()
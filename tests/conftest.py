@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# permite `pytest` na raiz do repositório sem instalar o pacote
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("openai")
+
+from services.insight_cache import InsightCache
+from services.insight_prewarm import InsightPrewarmer
+
+ROOT = Path(__file__).resolve().parents[1]
+BAD = "FORCE_INVALID_JSON"
+
+
+class OpenAIStub(BaseHTTPRequestHandler):
+    """
+    chat.completions mínimo: a 1ª resposta de cada requisição distinta não é JSON
+    (o prewarmer precisa tentar de novo); mensagens com BAD nunca devolvem JSON.
+    """
+    state = {}
+
+    def log_message(self, *a):
+        pass
+
+    def do_POST(self):
+        st = self.state
+        req = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        user = req["messages"][-1]["content"]
+        with st["lock"]:
+            st["calls"] += 1
+            st["active"] += 1
+            st["max_active"] = max(st["max_active"], st["active"])
+            first = user not in st["seen"]
+            st["seen"].add(user)
+        time.sleep(0.05)
+        content = "isto não é JSON" if first or BAD in user else json.dumps({"summary": "ok"})
+        body = json.dumps({"id": "x", "object": "chat.completion", "created": 0, "model": req["model"],
+                           "choices": [{"index": 0, "finish_reason": "stop",
+                                        "message": {"role": "assistant", "content": content}}]}).encode()
+        with st["lock"]:
+            st["active"] -= 1
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def api(monkeypatch, tmp_path):
+    OpenAIStub.state = {"lock": threading.Lock(), "calls": 0, "active": 0, "max_active": 0, "seen": set()}
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenAIStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("OPENAI_BASE_URL", f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.chdir(ROOT)   # a API resolve data/ a partir do diretório corrente
+    import app
+    monkeypatch.setattr(app, "INSIGHTS", InsightCache(tmp_path / "insights.sqlite"))
+    yield app
+    server.shutdown()
+
+
+def test_prewarm_bounded_retried_and_cached(api):
+    snap = api.get_snapshot()
+    real = api._prewarm_jobs(snap)[:8]
+    assert len(real) > 3
+    bad = ("bad", lambda: api._cached_llm_json(api.OPENAI_MODEL, [{"role": "user", "content": BAD}]))
+    pre = InsightPrewarmer(api.get_snapshot, lambda s: real + [bad], concurrency=3, retries=2, backoff=0.01)
+
+    stats = asyncio.run(pre.run_for(snap))
+
+    st = OpenAIStub.state
+    assert stats["jobs"] == len(real) + 1
+    assert stats["ok"] == len(real) and stats["failed"] == 1
+    assert pre.last_version == snap.version
+    # no máximo `concurrency` chamadas simultâneas ao modelo
+    assert 1 < st["max_active"] <= 3
+    # cada job real: resposta inválida + 1 nova tentativa; o job ruim esgota as 3 tentativas
+    assert st["calls"] == 2 * len(real) + 3
+
+    # resultados no cache: rodar os mesmos jobs de novo não chama o modelo
+    calls = st["calls"]
+    assert all(fn() is not None for _, fn in real)
+    assert st["calls"] == calls
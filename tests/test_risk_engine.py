@@ -0,0 +1,190 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from services.risk_engine import (
+    HAZARD_FACTORS, LEVELS, U_SUBINDICES, bucket_risk, build_risk_cube, compile_filters, rank_orders,
+)
+
+THR = {"green_max": 0.3, "yellow_max": 0.6}
+
+
+@pytest.fixture
+def dfH():
+    # datas fora de ordem: sem data -> 1ª linha; data inexistente -> a mais recente (não a última linha)
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2025-11-02", "2025-11-01", "2025-11-04", "2025-11-03"]),
+        "H_score": [0.5, 0.2, 0.9, 0.75],
+    })
+    for k in HAZARD_FACTORS:
+        df[k] = rng.uniform(0, 1, len(df))
+    df.loc[1, "p6_pct"] = np.nan
+    return df
+
+
+@pytest.fixture
+def dfU():
+    return pd.DataFrame({
+        "bairro": [1, 2, "Centro", "Rio Branco", "Fátima"],
+        "U_static": [0.4, 0.5, 0.0, 0.6, 0.45],
+        "U_t": [0.4, np.nan, 0.0, 0.55, 0.2],   # NaN e 0 -> no_data
+        "u_cobertura": [0.1, 0.9, 0.5, np.nan, 0.7],
+        "u_micro": [0.2, 0.3, 0.4, 0.5, 0.6],
+        "u_macro": [0.6, 0.5, 0.4, 0.3, 0.2],
+        "u_permeabilidade": [0.3, 0.3, 0.3, 0.8, 0.1],
+    })
+
+
+def _pandas_risk(dfH, dfU, date=None, params=None):
+    """Caminho pandas original de /v1/risk/by_bairro (seleção de data, merge e filtros)."""
+    dfU = dfU.assign(bairro=dfU["bairro"].astype(str))
+    sel = dfH if date is None else dfH[dfH["date"].dt.date == pd.to_datetime(date).date()]
+    if sel.empty:
+        sel = dfH[dfH["date"] == dfH["date"].max()]
+    H = float(sel["H_score"].iloc[0]); row = sel.iloc[0]
+    df = dfU.copy()
+    df["U"] = df.get("U_t", df.get("U_static", 0)).fillna(0)
+    df["U_valid"] = df["U"] > 0
+    df["Risk_score"] = np.where(df["U_valid"], (H * (1 - df["U"])).clip(0, 1), np.nan)
+    df["Risk_level"] = [bucket_risk(x, THR) for x in df["Risk_score"]]
+    for k in HAZARD_FACTORS:
+        df[k] = row[k]
+    df["date"] = row["date"].date().isoformat(); df["H_score"] = H
+
+    params = params or {}
+    if params.get("risk_level"):
+        df = df[df["Risk_level"].isin({s.strip().lower() for s in params["risk_level"].split(",")})]
+    for key, col in [("risk", "Risk_score"), *[(k, k) for k in HAZARD_FACTORS + U_SUBINDICES]]:
+        lo = params.get(f"min_{key}"); hi = params.get(f"max_{key}")
+        if lo is not None: df = df[df[col] >= float(lo)]
+        if hi is not None: df = df[df[col] <= float(hi)]
+    return df.reset_index(drop=True)
+
+
+@pytest.mark.parametrize("date", [None, "2025-11-01", "2025-11-03", "2025-11-04T12:00", "2030-01-01"])
+def test_cube_matches_pandas(dfH, dfU, date):
+    cube = build_risk_cube(dfH, dfU, THR)
+    d = cube.date_index(date)
+    got = pd.DataFrame(cube.columns(d))
+    ref = _pandas_risk(dfH, dfU, date)
+    assert got["bairro"].tolist() == ref["bairro"].tolist()
+    assert (got["date"] == ref["date"]).all()
+    for col in ["H_score", "U", "Risk_score", *HAZARD_FACTORS, *U_SUBINDICES]:
+        np.testing.assert_array_equal(got[col].to_numpy(float), ref[col].to_numpy(float), err_msg=col)
+    assert got["U_valid"].tolist() == ref["U_valid"].tolist()
+    assert got["Risk_level"].tolist() == ref["Risk_level"].tolist()
+
+
+def test_no_data_for_nan_or_zero_u(dfH, dfU):
+    cube = build_risk_cube(dfH, dfU, THR)
+    nd = [cube.bairro_index("2"), cube.bairro_index("Centro")]   # U_t NaN e U_t 0
+    assert not cube.valid[nd].any()
+    assert np.isnan(cube.score[:, nd]).all()
+    assert (cube.level[:, nd] == LEVELS.index("no_data")).all()
+    assert not np.isin(cube.rank, nd).any()
+    assert (cube.rank_len == 3).all()
+    for r in cube.records(cube.date_index("2030-01-01"), nd):
+        assert r["Risk_score"] is None and r["Risk_level"] == "no_data" and r["U_valid"] is False
+
+
+def test_date_and_bairro_index(dfH, dfU):
+    dfH = pd.concat([dfH, dfH.iloc[[0]].assign(H_score=0.0)], ignore_index=True)   # data repetida
+    dfU = pd.concat([dfU, dfU.iloc[[3]].assign(U_t=0.9)], ignore_index=True)       # bairro repetido
+    cube = build_risk_cube(dfH, dfU, THR)
+    assert cube.date_index(None) == 0
+    assert cube.date_index("2025-11-02") == 0          # a primeira ocorrência vence
+    assert cube.date_index("2025-11-03") == 3
+    assert cube.date_index("1999-01-01") == cube.date_index("2030-01-01") == 2   # data mais recente
+    with pytest.raises(ValueError):
+        cube.date_index("amanha")
+    assert cube.bairro_index(1) == cube.bairro_index("1") == 0
+    assert cube.bairro_index("Rio Branco") == 3
+    assert cube.bairro_index("rio branco") is None
+    assert len(cube.date_range("2025-11-02", "2025-11-03")) == 3
+
+
+def test_hazard_by_bairro_overrides(dfH, dfU):
+    dfHB = pd.DataFrame({
+        "date": pd.to_datetime(["2025-11-01", "2025-11-01", "2030-01-01"]),
+        "bairro": ["1", "inexistente", "1"],
+        "H_score": [0.8, 0.1, 0.1],
+        "p6_pct": [0.95, 0.1, 0.1],
+    })
+    cube = build_risk_cube(dfH, dfU, THR, dfHB)
+    d, b = cube.date_index("2025-11-01"), cube.bairro_index("1")
+    assert cube.local_hazard
+    assert cube.H[d, b] == 0.8 and cube.factors["p6_pct"][d, b] == 0.95
+    assert cube.H_city[d] == 0.2
+    others = np.arange(len(cube.bairros)) != b
+    assert (cube.H[d, others] == 0.2).all()
+    assert cube.score[d, b] == pytest.approx(0.8 * (1 - 0.4))
+
+
+@pytest.mark.parametrize("params", [
+    {},
+    {"risk_level": "red,YELLOW"},
+    {"risk_level": "no_data"},
+    {"min_risk": 0.2, "max_risk": 0.5},
+    {"min_p6_pct": 0.0},                  # NaN nunca passa
+    {"max_u_cobertura": 0.8},
+    {"min_u_micro": 0.3, "risk_level": "green,yellow,red"},
+    {"min_sm_norm": 2.0},
+])
+@pytest.mark.parametrize("date", ["2025-11-01", "2025-11-04"])
+def test_filters_match_pandas(dfH, dfU, params, date):
+    cube = build_risk_cube(dfH, dfU, THR)
+    d = cube.date_index(date)
+    flt = compile_filters(params)
+    got = [cube.bairros[i] for i in np.flatnonzero(cube.filter_mask(flt, d))]
+    assert got == _pandas_risk(dfH, dfU, date, params)["bairro"].tolist()
+
+
+def test_filter_mask_broadcast_and_missing_columns():
+    flt = compile_filters({"risk_level": "red", "min_risk": 0.5, "max_p6_pct": 0.4, "min_u_macro": 0.1})
+    assert {c for c, _, _ in flt.ranges} == {"Risk_score", "p6_pct", "u_macro"}
+    level = np.array([[2, 2, 1], [2, 3, 2]], dtype=np.int8)
+    score = np.array([[0.7, 0.9, 0.4], [0.55, np.nan, 0.4]])
+    p6 = np.array([[0.1], [0.3]])   # (D, 1): faz broadcast por bairro
+    # u_macro ausente -> ignorado
+    m = flt.mask(level, {"Risk_score": score, "p6_pct": p6})
+    assert m.tolist() == [[True, True, False], [True, False, False]]
+    assert compile_filters({}).mask(level, {}).all()
+
+
+def _lexsort_rank(score, valid, k):
+    """Referência: score desc., empates pelo índice do bairro."""
+    out = []
+    for s in score:
+        idx = np.flatnonzero(valid & ~np.isnan(s))
+        out.append(idx[np.lexsort((idx, -s[idx]))][:k].tolist())
+    return out
+
+
+@pytest.mark.parametrize("k", [1, 3, 7, 12, 40])
+@pytest.mark.parametrize("seed", range(4))
+def test_rank_orders_ties_by_bairro_index(k, seed):
+    rng = np.random.default_rng(seed)
+    D, B = 6, 12
+    score = rng.integers(0, 4, (D, B)) / 4.0          # muitos empates, inclusive no k-ésimo
+    score[rng.random((D, B)) < 0.2] = np.nan
+    score[2] = np.nan                                # data sem nenhum dado
+    score[4, :] = 0.5                                # empate total
+    valid = rng.random(B) > 0.25
+    rank, rank_len = rank_orders(score, valid, k)
+    assert rank.shape == (D, min(k, B))
+    ref = _lexsort_rank(score, valid, k)
+    for d in range(D):
+        n = int(rank_len[d])
+        assert rank[d, :n].tolist() == ref[d]
+        assert (rank[d, n:] == -1).all()
+    assert rank_len[2] == 0 and (rank[2] == -1).all()
+    assert rank_len.max() <= valid.sum()              # k > nº de bairros válidos: só os válidos
+
+
+def test_top_beyond_precomputed_rank(dfH, dfU):
+    cube = build_risk_cube(dfH, dfU, THR)
+    for d in range(len(cube.dates)):
+        ref = _lexsort_rank(cube.score[[d]], cube.valid, 100)[0]
+        assert cube.top(d, 2).tolist() == ref[:2]
+        assert cube.top(d, 100).tolist() == ref
@@ -0,0 +1,128 @@
+import asyncio
+import importlib
+import json
+import os
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("requests_cache")
+pytest.importorskip("retry_requests")
+
+from services import storage
+from services.scheduler import HazardScheduler
+from services.snapshot import SnapshotStore
+
+
+class OpenMeteoStub(BaseHTTPRequestHandler):
+    """Forecast + Flood API mínimos (multi-localização, timeformat=unixtime)."""
+    state = {"rain": 1.0, "fail": False, "hits": 0}
+
+    def log_message(self, *a):
+        pass
+
+    def do_GET(self):
+        st = self.state
+        st["hits"] += 1
+        if st["fail"]:
+            body = b"<html>bad gateway</html>"
+        else:
+            q = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+            lats = q["latitude"][0].split(",")
+            start = int(time.time()) // 86400 * 86400 - 3 * 3600
+            hours = [start + 3600 * i for i in range(24 * 16)]
+            hourly = q.get("hourly", [""])[0].split(",")
+            daily = q.get("daily", [""])[0].split(",")
+
+            def one(k):
+                rain = [st["rain"] * ((i * 7 + k) % 24) / 10 for i in range(len(hours))]
+                h = {v: (rain if v == "precipitation" else [0.2 if "soil" in v else 40.0] * len(hours))
+                     for v in hourly if v}
+                d = {v: [st["rain"] * (1 + i % 5) for i in range(16)] for v in daily if v}
+                return {"hourly": {"time": hours, **h}, "daily": {"time": hours[::24], **d}}
+
+            out = [one(k) for k in range(len(lats))]
+            body = json.dumps(out if len(out) > 1 else out[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def apimeteo(monkeypatch):
+    OpenMeteoStub.state.update(rain=1.0, fail=False, hits=0)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpenMeteoStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setenv("OPEN_METEO_FORECAST_URL", url + "/v1/forecast")
+    monkeypatch.setenv("OPEN_METEO_FLOOD_URL", url + "/v1/flood")
+    import services.apimeteo_conn as am
+    am = importlib.reload(am)   # URLs são lidas no import
+    import requests
+    monkeypatch.setattr(am, "_session", requests.Session())   # sem cache HTTP: cada execução bate no stub
+    monkeypatch.setattr(am, "bairro_points", lambda *a, **k: pd.DataFrame(
+        {"bairro": ["Centro", "Niterói"], "lat": [-29.917, -29.93], "lon": [-51.183, -51.21]}))
+    yield am
+    server.shutdown()
+    monkeypatch.undo()
+    importlib.reload(am)
+
+
+def _replaces(monkeypatch):
+    calls = []
+    real = os.replace
+
+    def spy(src, dst):
+        calls.append((os.path.basename(src), os.path.basename(dst)))
+        real(src, dst)
+    monkeypatch.setattr(os, "replace", spy)
+    return calls
+
+
+def test_run_once_writes_atomically_and_swaps_snapshot(apimeteo, tmp_path, monkeypatch):
+    hazard = tmp_path / "hazard_forecast.csv"
+    store = SnapshotStore(storage.sources(hazard), lambda version, sig: SimpleNamespace(
+        version=version, signature=sig, hazard=storage.read_table(hazard)))
+    sched = HazardScheduler(interval=0, out_dir=tmp_path, on_publish=lambda: store.refresh(force=True))
+    replaces = _replaces(monkeypatch)
+
+    assert asyncio.run(sched.run_once())
+    assert sched.last_error is None and OpenMeteoStub.state["hits"] > 0
+    first = store.get()
+    assert first.version == 1 and len(first.hazard) and "H_score" in first.hazard
+
+    # toda saída passa por arquivo temporário + rename; hazard_forecast é o último publicado
+    published = [dst for _, dst in replaces]
+    assert all(src.startswith(".") and src.endswith(".tmp") for src, _ in replaces)
+    assert published[-1] == storage.resolve(hazard).name
+    assert storage.resolve(tmp_path / "hazard_by_bairro.csv").name in published
+    assert not list(tmp_path.glob(".*.tmp"))
+
+    # nova previsão -> novo snapshot com os dados novos
+    OpenMeteoStub.state["rain"] = 5.0
+    assert asyncio.run(sched.run_once())
+    second = store.get()
+    assert second.version == 2 and second is not first
+    assert not first.hazard["p1_mm"].equals(second.hazard["p1_mm"])
+
+
+def test_failed_run_keeps_previous_files(apimeteo, tmp_path):
+    hazard = tmp_path / "hazard_forecast.csv"
+    published = []
+    sched = HazardScheduler(interval=0, out_dir=tmp_path, on_publish=lambda: published.append(1))
+    assert asyncio.run(sched.run_once())
+    src = storage.resolve(hazard)
+    before = (src.read_bytes(), src.stat().st_mtime_ns)
+
+    OpenMeteoStub.state["fail"] = True
+    assert not asyncio.run(sched.run_once())
+    assert sched.last_error and published == [1]
+    assert (src.read_bytes(), src.stat().st_mtime_ns) == before
+    assert not list(tmp_path.glob(".*.tmp"))
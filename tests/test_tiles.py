@@ -0,0 +1,63 @@
+import math
+
+import numpy as np
+import pytest
+import shapely
+from shapely.geometry import shape
+
+from services.tiles import TileIndex, encode_tile
+
+mvt = pytest.importorskip("mapbox_vector_tile")
+
+
+def _tile(lon, lat, z):
+    n = 1 << z
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2 * n)
+    return x, y
+
+
+def _ragged(lon, lat, r, seed, n=300):
+    # polígono válido com vértices muito próximos: o arredondamento ingênuo gera auto-interseções
+    rng = np.random.default_rng(seed)
+    t = np.sort(rng.uniform(0, 2 * np.pi, n))
+    rad = r * (1 + 0.02 * rng.standard_normal(n))
+    return shapely.Polygon(np.column_stack([lon + rad * np.cos(t), lat + rad * np.sin(t)]))
+
+
+@pytest.mark.parametrize("z", [10, 12, 14])
+@pytest.mark.parametrize("seed", range(5))
+def test_tile_polygons_decode_valid(z, seed):
+    lon, lat = -51.18, -29.92
+    r = 0.01 * 2 ** (10 - z)
+    geoms = [_ragged(lon, lat, r, seed), _ragged(lon + 2 * r, lat, r / 2, seed + 100)]
+    assert all(g.is_valid for g in geoms)
+    x, y = _tile(lon, lat, z)
+    data = encode_tile(TileIndex(geoms), z, x, y, [{"bairro": "a", "n": 1}, {"bairro": "b", "n": 2}])
+    feats = mvt.decode(data)["bairros_risk"]["features"]
+    assert feats
+    for f in feats:
+        g = shape(f["geometry"])
+        assert not g.is_empty
+        assert g.is_valid, shapely.is_valid_reason(g)
+    assert {f["properties"]["bairro"] for f in feats} <= {"a", "b"}
+
+
+def test_tile_collapsed_polygon_dropped():
+    lon, lat = -51.18, -29.92
+    index = TileIndex([shapely.box(lon, lat, lon + 1e-7, lat + 1e-7)])   # < 1 unidade do tile em z10
+    x, y = _tile(lon, lat, 10)
+    assert encode_tile(index, 10, x, y, [{"bairro": "a"}]) == b""
+
+
+def test_tile_endpoint_invalid_date(monkeypatch):
+    from pathlib import Path
+    from fastapi.testclient import TestClient
+    monkeypatch.chdir(Path(__file__).resolve().parents[1])   # a API resolve data/ a partir do diretório corrente
+    import app
+    client = TestClient(app.app)   # sem `with`: não inicia as tarefas de fundo do lifespan
+    x, y = _tile(-51.18, -29.92, 12)
+    assert client.get(f"/v1/tiles/2025-13-45/12/{x}/{y}.mvt").status_code == 404
+    assert client.get(f"/v1/tiles/amanha/12/{x}/{y}.mvt").status_code == 404
+    ok = client.get(f"/v1/tiles/{app.get_snapshot().cube.dates[0]}/12/{x}/{y}.mvt")
+    assert ok.status_code == 200 and ok.headers["content-type"].startswith("application/")